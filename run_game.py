@@ -1,9 +1,15 @@
 #!/usr/bin/env python3
+import time
+launch_time = time.perf_counter()
+
 import sys
 
 if sys.version_info < (3, 6):
     sys.exit("Sorry, Dynamite Valley requires Python 3.6 or newer.")
 
+args = sys.argv[1:]
+debug = '--debug' in args
+
 try:
     # suppress pygame printing its banner :p
     import builtins
@@ -11,15 +17,22 @@ try:
     def print(*a): pass
     builtins.print = print
     import pyglet
+    if not debug:
+        # Checking for errors after every GL call is slow, and pyglet
+        # only turns it off by itself under -O.  This has to happen
+        # before anything imports pyglet.gl.
+        pyglet.options['debug_gl'] = False
     import pygame
+    import numpy
+    imported_time = time.perf_counter()
 except ImportError:
-    sys.exit("Can't run Dynamite Valley!  Please install both Pyglet and PyGame.")
+    sys.exit("Can't run Dynamite Valley!  Please install Pyglet, PyGame and NumPy.")
 
 print = old_print
 builtins.print = old_print
 
 import os.path
-import subprocess
+import types
 
 argv0dir = os.path.dirname(sys.argv[0])
 srcdir= os.path.normcase(os.path.abspath(__file__))
@@ -29,10 +42,27 @@ srcdir.pop()
 srcdir.append('src')
 srcdir = slash.join(srcdir)
 os.chdir(srcdir)
+sys.path.insert(0, srcdir)
+
+from dynamite import startup
+startup.mark('interpreter start', launch_time)
+startup.mark('pyglet/pygame import', imported_time)
+
+# Run the game right here, rather than starting a second interpreter
+# with -O.  game.py is compiled optimized, so its asserts are stripped
+# and __debug__ is False, which turns off log(); along with turning off
+# GL error checking above, that covers what -O did for us, except for
+# the asserts in pyglet itself.  Pass --debug to keep all of it.
+if debug:
+    args.remove('--debug')
+sys.argv[1:] = args
 
-interpreter = sys.executable or "python3"
-cmdline = [interpreter, "-O", "game.py"]
-cmdline.extend(sys.argv[1:])
-result = subprocess.run(cmdline)
+path = os.path.join(srcdir, 'game.py')
+with open(path, 'rb') as f:
+    code = compile(f.read(), path, 'exec', optimize=0 if debug else 1)
 
-sys.exit(result.returncode)
+game = types.ModuleType('game')
+game.__file__ = path
+sys.modules['game'] = game
+exec(code, game.__dict__)
+game.main(args)
@@ -5,18 +5,57 @@
 
 
 from math import sin, pow, pi
+import weakref
 
+import numpy as np
 import pyglet.clock
 import pyglet.sprite
 
 TWEEN_FUNCTIONS = {}
 
+# Each tween function is also sampled into a lookup table, so that
+# tweens can be eased by interpolating rather than calling the function.
+# With this many samples the worst error is under 0.001, at the corners
+# of the bounce curves.
+USE_TABLES = True
+TABLE_SAMPLES = 2049
+TWEEN_INDEX = {}
+_table_rows = []
+_table = None
+
 
 def tweener(f):
+    global _table
     TWEEN_FUNCTIONS[f.__name__] = f
+    TWEEN_INDEX[f.__name__] = len(_table_rows)
+    xs = np.linspace(0, 1, TABLE_SAMPLES)
+    _table_rows.append([f(x) for x in xs.tolist()])
+    _table = None
     return f
 
 
+def ease_many(curves, n):
+    """Ease many tweens at once from the lookup tables.
+
+    curves is an array of indexes into TWEEN_INDEX, and n the fraction
+    of each tween that has passed, from 0 to 1.
+    """
+    global _table
+    if _table is None:
+        _table = np.array(_table_rows)
+    x = np.asarray(n) * (TABLE_SAMPLES - 1)
+    i = np.minimum(x.astype(int), TABLE_SAMPLES - 2)
+    frac = x - i
+    lo = _table[curves, i]
+    hi = _table[curves, i + 1]
+    return lo + (hi - lo) * frac
+
+
+def ease(tween, n):
+    """Ease a single tween from the lookup table for the named function."""
+    return float(ease_many(TWEEN_INDEX[tween], n))
+
+
 @tweener
 def linear(n):
     return n
@@ -135,6 +174,101 @@ def tween_attr(n, start, end):
         return tween(n, start, end)
 
 
+class Tweener:
+    """Updates all the animations on one clock, from one scheduled callback.
+
+    Animations occupy slots at the front of dense arrays of elapsed time
+    and duration; stopping one moves the last animation into its slot,
+    so there are no gaps and removal is O(1).  The tweener is only
+    scheduled while it has animations to run.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.animations = []
+        self.elapsed = np.zeros(16)
+        self.duration = np.ones(16)
+        self.curve = np.zeros(16, dtype=int)
+        self.scheduled = False
+
+    def __len__(self):
+        return len(self.animations)
+
+    def add(self, anim):
+        slot = len(self.animations)
+        if slot == len(self.elapsed):
+            self.elapsed = np.concatenate([self.elapsed, np.zeros(slot)])
+            self.duration = np.concatenate([self.duration, np.ones(slot)])
+            self.curve = np.concatenate([self.curve, np.zeros(slot, dtype=int)])
+        self.elapsed[slot] = 0
+        self.duration[slot] = anim.duration
+        self.curve[slot] = anim.curve
+        self.animations.append(anim)
+        anim.slot = slot
+        if not self.scheduled:
+            self.clock.schedule(self.update)
+            self.scheduled = True
+
+    def remove(self, anim):
+        slot = anim.slot
+        anim.slot = None
+        last = self.animations.pop()
+        if last is not anim:
+            end = len(self.animations)
+            self.animations[slot] = last
+            self.elapsed[slot] = self.elapsed[end]
+            self.duration[slot] = self.duration[end]
+            self.curve[slot] = self.curve[end]
+            last.slot = slot
+        if not self.animations and self.scheduled:
+            self.clock.unschedule(self.update)
+            self.scheduled = False
+
+    def update(self, dt):
+        count = len(self.animations)
+        elapsed = self.elapsed[:count]
+        elapsed += dt
+        progress = np.minimum(elapsed / self.duration[:count], 1.0)
+        if USE_TABLES:
+            eased = ease_many(self.curve[:count], progress).tolist()
+        else:
+            eased = [None] * count
+
+        # Animations may be started or stopped by callbacks as we go, so
+        # work from a snapshot; anything stopped has lost its slot.
+        for anim, n, e in zip(self.animations[:], progress.tolist(), eased):
+            if anim.slot is not None:
+                anim.update_to(n, e)
+
+
+# Each Tweener refers to its clock, so these entries only go away when
+# release() is called for the clock.
+_tweeners = weakref.WeakKeyDictionary()
+
+
+def get_tweener(clock=None):
+    """Get the Tweener for a clock, the default clock if not given."""
+    clock = clock or pyglet.clock.get_default()
+    try:
+        return _tweeners[clock]
+    except KeyError:
+        tweener = _tweeners[clock] = Tweener(clock)
+        return tweener
+
+
+def release(clock):
+    """Stop any animations on a clock, and forget its Tweener."""
+    tweener = _tweeners.pop(clock, None)
+    if tweener:
+        for anim in tweener.animations[:]:
+            anim.stop()
+
+
+def active_count():
+    """How many animations are running, on all clocks."""
+    return sum(len(t) for t in list(_tweeners.values()))
+
+
 class Animation:
     """An animation manager for object attribute animations.
 
@@ -145,11 +279,10 @@ class Animation:
     If the value is a list or tuple, then each value inside that will
     be tweened.
 
-    The update() method is automatically scheduled with the clock for
-    the duration of the animation.
+    The animation is updated by the Tweener for its clock for the
+    duration of the animation.
 
     """
-    animations = []
 
     # Animations are stored in _animation_dict under (object id, target
     # attribute) keys. Objects may not be hashable, so the id, rather than
@@ -166,12 +299,15 @@ class Animation:
                  **targets):
         self.targets = targets
         self.function = TWEEN_FUNCTIONS[tween]
+        self.curve = TWEEN_INDEX[tween]
         self.duration = duration
         self.on_finished = on_finished
-        self.t = 0
         self.object = object
+        # Sprites can be deleted out from under us
+        self.is_sprite = isinstance(object, pyglet.sprite.Sprite)
         self.initial = {}
         self.running = True
+        self.slot = None
         for k in self.targets:
             try:
                 a = getattr(object, k)
@@ -184,26 +320,30 @@ class Animation:
                 previous_animation._remove_target(k)
             self._animation_dict[key] = self
 
-        clock = clock or pyglet.clock
-        clock.schedule(self.update)
-        self.clock = clock
-        self.animations.append(self)
+        self.tweener = get_tweener(clock)
+        self.tweener.add(self)
 
-    def update(self, dt):
-        if isinstance(self.object, pyglet.sprite.Sprite):
-            if self.object.image is None:
-                self.clock.unschedule(self.update)
-                self.animations.remove(self)
-                return
-        self.t += dt
-        n = self.t / self.duration
-        if n > 1:
-            n = 1
+    @property
+    def t(self):
+        if self.slot is None:
+            return self.duration
+        return float(self.tweener.elapsed[self.slot])
+
+    def update_to(self, n, eased=None):
+        """Move to n, the fraction of the duration that has passed.
+
+        eased is n already passed through the tween function, if the
+        caller has it.
+        """
+        if self.is_sprite and self.object.image is None:
+            self.stop()
+            return
+        if n >= 1:
             self.stop(complete=True)
             if self.on_finished is not None:
                 self.on_finished()
             return
-        n = self.function(n)
+        n = self.function(n) if eased is None else eased
         for k in self.targets:
             v = tween_attr(n, self.initial[k], self.targets[k])
             setattr(self.object, k, v)
@@ -217,14 +357,15 @@ class Animation:
             targets will be set to some value between the start and
             end values.
         """
+        if not self.running:
+            return
         self.running = False
         if complete:
             for k in self.targets:
                 setattr(self.object, k, self.targets[k])
         for k in list(self.targets):
             self._remove_target(k, stop=False)
-        self.clock.unschedule(self.update)
-        self.animations.remove(self)
+        self.tweener.remove(self)
 
     def _remove_target(self, target, stop=True):
         del self.targets[target]
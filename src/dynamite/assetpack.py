@@ -0,0 +1,160 @@
+"""Pack all the game's resources into one file, and load them from it.
+
+The pack is a header, a JSON index of resource names to where their
+bytes are, then the bytes themselves.  It's memory-mapped when loaded,
+and installed as pyglet.resource's index, so starting up doesn't have
+to walk the resource directories or open and stat every file.
+
+To build the pack, from the src directory:
+
+    python -m dynamite.assetpack
+"""
+
+import io
+import json
+import mmap
+import os
+from pathlib import Path
+import struct
+import sys
+
+import pyglet.resource
+
+
+MAGIC = b'DVPACK1\n'
+HEADER = struct.Struct('<8sQ')
+ALIGN = 16
+
+# Resource directories, in pyglet.resource.path order
+DIRECTORIES = ['images', 'levels', 'sounds']
+
+# Music is streamed from its own file.
+EXCLUDE_SUFFIXES = {'.mp3'}
+
+
+def build(srcdir, path):
+    """Pack the resource directories under srcdir into path."""
+    srcdir = Path(srcdir)
+    files = {}
+    for directory in DIRECTORIES:
+        root = srcdir / directory
+        for file in sorted(root.rglob('*')):
+            if not file.is_file() or file.suffix in EXCLUDE_SUFFIXES:
+                continue
+            # The same names pyglet.resource would give them; the first
+            # directory to have a name wins, as with pyglet.
+            name = file.relative_to(root).as_posix()
+            files.setdefault(name, file)
+
+    contents = {name: file.read_bytes() for name, file in files.items()}
+
+    # Work out the index first, so we know how long it is.  Offsets are
+    # from the start of the data, which follows the index.
+    index = {}
+    offset = 0
+    for name, data in contents.items():
+        index[name] = [offset, len(data)]
+        offset += -len(data) % ALIGN + len(data)
+    index_bytes = json.dumps(index).encode('utf8')
+    data_start = HEADER.size + len(index_bytes)
+    data_start += -data_start % ALIGN
+
+    tmp = Path(str(path) + '.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(index_bytes)))
+        f.write(index_bytes)
+        for name, data in contents.items():
+            f.seek(data_start + index[name][0])
+            f.write(data)
+    os.replace(tmp, path)
+    return len(contents)
+
+
+class AssetPack:
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_size = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} isn't an asset pack")
+        index_end = HEADER.size + index_size
+        self.index = json.loads(bytes(self.map[HEADER.size:index_end]))
+        self.data_start = index_end + -index_end % ALIGN
+        self.view = memoryview(self.map)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def data(self, name):
+        """Get a resource's bytes, as a memoryview onto the pack."""
+        offset, size = self.index[name]
+        start = self.data_start + offset
+        return self.view[start:start + size]
+
+    def open(self, name, mode='rb'):
+        raw = PackFile(self.data(name))
+        if 'b' in mode:
+            return io.BufferedReader(raw)
+        return io.TextIOWrapper(io.BufferedReader(raw), encoding='utf8')
+
+
+class PackFile(io.RawIOBase):
+    """A read-only file onto a resource in the pack."""
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = min(len(buffer), len(self.data) - self.pos)
+        if n <= 0:
+            return 0
+        buffer[:n] = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += len(self.data)
+        self.pos = max(0, offset)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+
+class PackLocation(pyglet.resource.Location):
+    def __init__(self, pack):
+        self.pack = pack
+
+    def open(self, filename, mode='rb'):
+        return self.pack.open(filename, mode)
+
+
+def install(pack, loader=None):
+    """Make pyglet.resource load everything from the pack.
+
+    This stands in for pyglet.resource.reindex().
+    """
+    loader = loader or pyglet.resource._default_loader
+    # Reindexing an empty path just sets up the caches
+    loader.path = []
+    loader.reindex()
+    location = PackLocation(pack)
+    loader._index = dict.fromkeys(pack.index, location)
+
+
+if __name__ == '__main__':
+    srcdir = Path(__file__).parent.parent
+    path = Path(sys.argv[1]) if len(sys.argv) > 1 else srcdir / 'assets.pack'
+    count = build(srcdir, path)
+    print(f"Packed {count} resources into {path}")
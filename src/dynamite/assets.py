@@ -0,0 +1,197 @@
+"""A registry of assets, declared up front but loaded on demand.
+
+Assets are declared with a name, a function to load them, and the
+groups that need them.  Nothing is loaded until the asset is first
+used (with get()), its group is required (as when a screen that needs
+it starts), or it is preloaded in the background a little at a time.
+
+Loading can be split in two.  An asset's decode function, if it has one,
+runs on a worker thread and does the slow part--reading files and
+decoding pixels or samples.  Its loader then runs on the main thread,
+turning what was decoded into textures or sounds.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+import pyglet.image
+import pyglet.image.atlas
+import pyglet.resource
+
+from . import metrics
+
+
+executor = ThreadPoolExecutor(thread_name_prefix='assets')
+
+load_seconds = metrics.histogram(
+    'asset_load_seconds',
+    "Time to load an asset, decoding and all",
+)
+
+
+class Asset:
+    def __init__(self, name, loader, decode=None):
+        self.name = name
+        self.loader = loader
+        self.decode = decode
+        self.future = None
+        self.loaded = False
+        self.value = None
+        # How long each half of loading took, in seconds
+        self.decode_time = None
+        self.load_time = None
+
+    def __repr__(self):
+        state = 'loaded' if self.loaded else 'not loaded'
+        return f"<Asset {self.name} ({state})>"
+
+    def start(self):
+        """Start decoding on a worker thread, if there's any to do."""
+        if self.decode and not self.loaded and not self.future:
+            self.future = executor.submit(self._decode)
+
+    def _decode(self):
+        start = time.perf_counter()
+        data = self.decode()
+        self.decode_time = time.perf_counter() - start
+        return data
+
+    @property
+    def ready(self):
+        """True if get() can finish loading without waiting on a worker."""
+        return not self.future or self.future.done()
+
+    def get(self):
+        """Get the asset, loading it first if need be."""
+        if not self.loaded:
+            args = ()
+            if self.decode:
+                self.start()
+                args = (self.future.result(),)
+                self.future = None
+            start = time.perf_counter()
+            self.value = self.loader(*args)
+            self.load_time = time.perf_counter() - start
+            self.loaded = True
+            load_seconds.observe((self.decode_time or 0) + self.load_time)
+        return self.value
+
+
+assets = {}
+groups = {}
+
+
+def declare(name, loader, group=None, decode=None):
+    """Declare an asset, returning it unloaded.
+
+    If decode is given, it is called on a worker thread, and whatever it
+    returns is passed to loader on the main thread.
+    """
+    asset = assets[name] = Asset(name, loader, decode)
+    if group:
+        groups.setdefault(group, []).append(asset)
+    return asset
+
+
+def get(name):
+    return assets[name].get()
+
+
+def pending(*group_names):
+    """Get the assets in the named groups that are still to be loaded."""
+    return [
+        a
+        for name in group_names
+        for a in groups.get(name, ())
+        if not a.loaded
+    ]
+
+
+def require(*group_names):
+    """Load, right now, everything the named groups need.
+
+    Returns the assets that had to be loaded.
+    """
+    todo = pending(*group_names)
+    for asset in todo:
+        asset.start()
+    for asset in todo:
+        asset.get()
+    return todo
+
+
+def preload(clock, *group_names):
+    """Load groups in the background.
+
+    Everything is decoded on the worker threads straight away; then
+    one asset per tick of the given clock is finished off, as they
+    become ready.  Anything needed sooner is still loaded when it's used.
+    """
+    for asset in pending(*group_names):
+        asset.start()
+
+    def load_next(dt):
+        for asset in pending(*group_names):
+            if asset.ready:
+                asset.get()
+                break
+        if not pending(*group_names):
+            clock.unschedule(load_next)
+    clock.schedule(load_next)
+
+
+def report(loaded):
+    """Describe how long the given assets took to load."""
+    lines = []
+    for asset in loaded:
+        decode = asset.decode_time or 0
+        load = asset.load_time or 0
+        lines.append(f"{asset.name:<24} decode {decode * 1000:7.1f}ms  load {load * 1000:7.1f}ms")
+    return '\n'.join(lines)
+
+
+def decode_image(filename):
+    """Decode an image from pyglet's resource path.  Safe on a worker."""
+    with pyglet.resource.file(filename) as f:
+        return pyglet.image.load(filename, file=f)
+
+
+# pyglet.resource's image cache only holds weak references, so we hold
+# on to the textures we put in it, or they'd be gone straight away.
+textures = {}
+
+
+def upload_image(filename, img):
+    """Upload a decoded image into pyglet.resource's cache.
+
+    pyglet.resource.image(filename) will then return it without loading
+    it again.  This does what pyglet.resource.Loader does when it loads
+    an image itself, minus the decoding.
+    """
+    loader = pyglet.resource._default_loader
+    if filename in loader._cached_images:
+        return
+    bin = loader._get_texture_atlas_bin(img.width, img.height)
+    if bin is None:
+        texture = img.get_texture(True)
+    else:
+        texture = bin.add(img)
+    textures[filename] = loader._cached_images[filename] = texture
+
+
+def declare_images(name, filenames, loader, group=None):
+    """Declare an asset made from image files.
+
+    The images are decoded on a worker thread and uploaded to textures
+    before loader is called, so its calls to pyglet.resource.image()
+    just find them in the cache.
+    """
+    def decode():
+        return [(f, decode_image(f)) for f in filenames]
+
+    def load(images):
+        for f, img in images:
+            upload_image(f, img)
+        return loader()
+
+    return declare(name, load, group, decode=decode)
@@ -0,0 +1,95 @@
+import math
+import random
+
+from pyglet import gl
+
+
+class Camera:
+    """A camera offset that can be shaken, and springs back to rest.
+
+    The spring is only integrated while the camera is moving: once it
+    has settled, the camera unschedules itself, and shake() wakes it up
+    again.
+
+    The offset is applied through the projection matrix, and only when
+    the camera isn't at rest.
+    """
+
+    # Below these (pixels, and pixels per second) the camera is at rest.
+    REST_OFFSET = 0.5
+    REST_VELOCITY = 5
+
+    # Fixed timestep, which guarantees stable behaviour.
+    DT = 0.05
+    STIFFNESS = 300 * DT
+    VELOCITY_DAMPING = 0.1 ** DT
+    OFFSET_DAMPING = 0.01 ** DT
+
+    def __init__(self, window, clock):
+        self.window = window
+        self.clock = clock
+        self.x = self.y = 0.0
+        self.vx = self.vy = 0.0
+        self.awake = False
+        self.applied = False
+
+    def shake(self, dist=25):
+        """Knock the camera dist pixels in a random direction."""
+        angle = random.uniform(0, math.tau)
+        self.x = dist * math.sin(angle)
+        self.y = dist * math.cos(angle)
+        if not self.awake:
+            self.clock.schedule(self.update)
+            self.awake = True
+
+    def sleep(self):
+        if self.awake:
+            self.clock.unschedule(self.update)
+            self.awake = False
+
+    def update(self, dt):
+        dt = self.DT
+        self.x += self.vx * dt
+        self.y += self.vy * dt
+        self.vx -= self.x * self.STIFFNESS
+        self.vy -= self.y * self.STIFFNESS
+        self.vx *= self.VELOCITY_DAMPING
+        self.vy *= self.VELOCITY_DAMPING
+        self.x *= self.OFFSET_DAMPING
+        self.y *= self.OFFSET_DAMPING
+
+        if (abs(self.x) < self.REST_OFFSET
+                and abs(self.y) < self.REST_OFFSET
+                and abs(self.vx) < self.REST_VELOCITY
+                and abs(self.vy) < self.REST_VELOCITY):
+            self.x = self.y = self.vx = self.vy = 0.0
+            self.sleep()
+
+    @property
+    def offset(self):
+        return round(self.x), round(self.y)
+
+    def begin(self):
+        """Start drawing the world as seen through the camera."""
+        x, y = self.offset
+        if not (x or y):
+            return
+        self._set_projection(-x, -y)
+        self.applied = True
+
+    def end(self):
+        """Go back to drawing in screen space."""
+        if self.applied:
+            self._set_projection(0, 0)
+            self.applied = False
+
+    def _set_projection(self, left, bottom):
+        # Same as pyglet's default Window.on_resize(), shifted.
+        gl.glMatrixMode(gl.GL_PROJECTION)
+        gl.glLoadIdentity()
+        gl.glOrtho(
+            left, left + max(1, self.window.width),
+            bottom, bottom + max(1, self.window.height),
+            -1, 1
+        )
+        gl.glMatrixMode(gl.GL_MODELVIEW)
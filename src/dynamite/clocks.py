@@ -0,0 +1,100 @@
+"""One tree of clocks, driven from one callback on pyglet's clock.
+
+The root clock is scheduled once on pyglet's default clock.  Every
+frame it passes the elapsed time down to its children in the order they
+were created, and each child runs its scheduled functions and passes
+the time on down to its own children.
+
+A clock can be paused, which stops it and everything under it, or
+scaled, which speeds it up or slows it down along with everything
+under it.
+
+    root
+     +- game     gameplay: logic ticks, water flow, sparks, particles
+     +- screens  one child per title/intro/game screen, while it runs
+"""
+
+import pyglet.clock
+
+from . import animation
+
+
+class ChildClock(pyglet.clock.Clock):
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.t = 0.0
+        self.scale = 1.0
+        self.paused = False
+        self.children = []
+        # Set whenever one of our scheduled functions runs; cleared by
+        # whoever is interested (such as a Screen, deciding to redraw).
+        self.changed = False
+        super().__init__(time_function=self._time)
+
+    def __repr__(self):
+        return f"ChildClock({self.name}, {self.t:.3f}, scale={self.scale})"
+
+    def _time(self):
+        return self.t
+
+    def child(self, name):
+        """Create a new clock under this one."""
+        clock = ChildClock(name, self)
+        self.children.append(clock)
+        return clock
+
+    def remove(self):
+        """Detach this clock from its parent; it stops getting time.
+
+        Any animations on it, or on clocks under it, are stopped.
+        """
+        if self.parent:
+            self.parent.children.remove(self)
+            self.parent = None
+        stack = [self]
+        while stack:
+            clock = stack.pop()
+            animation.release(clock)
+            stack.extend(clock.children)
+
+    def advance(self, dt):
+        """Move time on by dt (before scaling) and run anything due.
+
+        Returns True if anything ran, here or below.
+        """
+        if self.paused:
+            return False
+        dt *= self.scale
+        self.t += dt
+        ran = self.call_scheduled_functions(self.update_time())
+        if ran:
+            self.changed = True
+        for child in self.children[:]:
+            ran = child.advance(dt) or ran
+        return ran
+
+
+def scheduled_count():
+    """How many functions are scheduled, on all our clocks and pyglet's."""
+    def count(clock):
+        return len(clock._schedule_items) + len(clock._schedule_interval_items)
+    total = count(pyglet.clock.get_default())
+    stack = [root]
+    while stack:
+        clock = stack.pop()
+        total += count(clock)
+        stack.extend(clock.children)
+    return total
+
+
+root = ChildClock('root')
+game = root.child('game')
+screens = root.child('screens')
+
+
+def _tick(dt):
+    root.advance(dt)
+
+
+pyglet.clock.schedule(_tick)
@@ -38,29 +38,33 @@ class LevelRenderer:
         'gwgw': (2, 5),
     }
 
-    def __init__(self, level):
+    def __init__(self, level, layout=None):
         self.level = level
-        self.rebuild()
+        self.rebuild(layout)
 
-    def rebuild(self):
-        """Rebuild the batch based on the current contents of the level."""
-        batch = pyglet.graphics.Batch()
-        sprites = []
+    @classmethod
+    def layout(cls, width, height, get):
+        """Work out which tile image goes where, for a map.
+
+        get(pos) gets the map tile at pos.  This doesn't touch OpenGL,
+        so it can be worked out in the background.
+        """
         def q(x, y):
             if x < 0:
                 x = 0
-            elif x >= self.level.width:
-                x = self.level.width - 1
+            elif x >= width:
+                x = width - 1
             if y < 0:
                 return 'w'
-            elif y >= self.level.height:
-                y = self.level.height - 1
-            t = self.level.get(Vec2D(x, y))
+            elif y >= height:
+                y = height - 1
+            t = get(Vec2D(x, y))
             return 'w' if t.water else 'g'
         coords = product(
-            range(-1, self.level.width + 1),
-            range(-1, self.level.height + 1)
+            range(-1, width + 1),
+            range(-1, height + 1)
         )
+        tiles = []
         for x, y in coords:
             bitv = (
                 q(x + 1, y) +
@@ -69,7 +73,17 @@ class LevelRenderer:
                 q(x, y)
             )
             screenx, screeny = map_to_screen(Vec2D(x, y))
-            tx, ty = self.tilemap[bitv]
+            tx, ty = cls.tilemap[bitv]
+            tiles.append((screenx, screeny, tx, ty))
+        return tiles
+
+    def rebuild(self, layout=None):
+        """Rebuild the batch based on the current contents of the level."""
+        if layout is None:
+            layout = self.layout(self.level.width, self.level.height, self.level.get)
+        batch = pyglet.graphics.Batch()
+        sprites = []
+        for screenx, screeny, tx, ty in layout:
             sprites.append(
                 pyglet.sprite.Sprite(
                     self.tiles[ty, tx],
@@ -1,4 +1,5 @@
 from collections import namedtuple
+import io
 import os
 import re
 
@@ -51,6 +52,17 @@ def load_legend(filename, lines):
 
     return legend
 
+def _mtime(f):
+    """Get the modification time of a resource file, if it has one.
+
+    Resources loaded from the asset pack don't.
+    """
+    try:
+        return os.fstat(f.fileno()).st_mtime
+    except (OSError, io.UnsupportedOperation):
+        return None
+
+
 def load_map(filename, globals_=globals()):
     """Load a map from a text file.
 
@@ -64,13 +76,13 @@ def load_map(filename, globals_=globals()):
 
     legend_filename = "legend.txt"
     with pyglet.resource.file(legend_filename, 'rt') as f:
-        legend_mtime = os.fstat(f.fileno()).st_mtime
+        legend_mtime = _mtime(f)
         legend = load_legend(legend_filename, enumerated_text(f.read()))
 
     if not filename.endswith(".txt"):
         filename += ".txt"
     with pyglet.resource.file(filename, 'rt') as f:
-        mtime = os.fstat(f.fileno()).st_mtime
+        mtime = _mtime(f)
         map_text = f.read()
 
     lines = enumerated_text(map_text)
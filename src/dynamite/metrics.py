@@ -0,0 +1,181 @@
+"""Counters, gauges and histograms for a play session, for other tools.
+
+The game only ever bumps a counter or drops a value into a histogram's
+bucket, which is as cheap as we can make it.  Every so often, and when
+the game exits, the lot is written out to a file--as JSON if its name
+ends in .json, otherwise in Prometheus' text format, for the node
+exporter's textfile collector or anything else that reads it.
+
+Files are written to a temporary file and renamed into place, so a
+reader never sees half of one.
+"""
+
+import atexit
+import bisect
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+from pathlib import Path
+import time
+
+
+PREFIX = 'dynamite_'
+
+# Bucket upper bounds, in seconds, for timings
+TIME_BUCKETS = (
+    0.001, 0.002, 0.004, 0.008, 0.016, 0.033, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5
+)
+
+# Seconds between exports
+EXPORT_INTERVAL = 10.0
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+    def as_dict(self):
+        return {'value': self.value}
+
+    def prometheus_lines(self):
+        yield f"{PREFIX}{self.name} {self.value}"
+
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def as_dict(self):
+        return {'value': self.value}
+
+    def prometheus_lines(self):
+        yield f"{PREFIX}{self.name} {self.value}"
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets=TIME_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        # One count per bucket, and one for anything bigger
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def as_dict(self):
+        return {
+            'buckets': dict(zip(map(str, self.buckets), self.counts)),
+            'overflow': self.counts[-1],
+            'sum': self.sum,
+            'count': self.count,
+        }
+
+    def prometheus_lines(self):
+        name = PREFIX + self.name
+        total = 0
+        for bound, n in zip(self.buckets, self.counts):
+            total += n
+            yield f'{name}_bucket{{le="{bound}"}} {total}'
+        yield f'{name}_bucket{{le="+Inf"}} {self.count}'
+        yield f"{name}_sum {self.sum}"
+        yield f"{name}_count {self.count}"
+
+
+metrics = {}
+
+
+def counter(name, help):
+    """Get the counter with this name, creating it if need be."""
+    if name not in metrics:
+        metrics[name] = Counter(name, help)
+    return metrics[name]
+
+
+def gauge(name, help):
+    """Get the gauge with this name, creating it if need be."""
+    if name not in metrics:
+        metrics[name] = Gauge(name, help)
+    return metrics[name]
+
+
+def histogram(name, help, buckets=TIME_BUCKETS):
+    """Get the histogram with this name, creating it if need be."""
+    if name not in metrics:
+        metrics[name] = Histogram(name, help, buckets)
+    return metrics[name]
+
+
+def as_json():
+    return json.dumps({
+        'time': time.time(),
+        'metrics': {
+            name: dict(type=m.kind, help=m.help, **m.as_dict())
+            for name, m in metrics.items()
+        },
+    }, indent=2)
+
+
+def as_prometheus():
+    lines = []
+    for m in metrics.values():
+        lines.append(f"# HELP {PREFIX}{m.name} {m.help}")
+        lines.append(f"# TYPE {PREFIX}{m.name} {m.kind}")
+        lines.extend(m.prometheus_lines())
+    return '\n'.join(lines) + '\n'
+
+
+def write_atomic(path, text):
+    tmp = path.with_name(path.name + '.tmp')
+    try:
+        tmp.write_text(text)
+        os.replace(tmp, path)
+    except OSError:
+        # Metrics aren't worth crashing the game over
+        pass
+
+
+class Exporter:
+    """Write the metrics to a file every so often, and at exit.
+
+    The text is put together on the main thread, so it's a consistent
+    snapshot, and written out on a worker thread of its own.
+    """
+
+    def __init__(self, path, clock, interval=EXPORT_INTERVAL):
+        self.path = Path(path)
+        self.format = as_json if self.path.suffix == '.json' else as_prometheus
+        self.clock = clock
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix='metrics')
+        clock.schedule_interval(self.export, interval)
+        atexit.register(self.close)
+
+    def export(self, dt=0):
+        self.executor.submit(write_atomic, self.path, self.format())
+
+    def close(self):
+        """Stop exporting, and write the final figures."""
+        self.clock.unschedule(self.export)
+        atexit.unregister(self.close)
+        self.executor.shutdown(wait=True)
+        write_atomic(self.path, self.format())
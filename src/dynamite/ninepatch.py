@@ -29,22 +29,6 @@ __all__ = ["NinePatch"]
 
 from pyglet.gl import *
 
-class PixelData(object):
-    def __init__(self, image):
-        image_data = image.get_image_data()
-        self.has_alpha = 'A' in image_data.format
-        self.data = image_data.get_data("RGBA", image.width * 4)
-        self.width = image.width
-        self.height = image.height
-
-    def is_black(self, x, y):
-        p = (y * self.width + x) * 4
-        if self.has_alpha:
-            if self.data[p+3] == '\x00':
-                return False # Fully transparent
-
-        return self.data[p:p+3] == '\x00\x00\x00'
-
 class NinePatch(object):
     """A scalable 9-patch image.
     """
@@ -61,6 +45,11 @@ class NinePatch(object):
     border_right = 6
     border_bottom = 6
 
+    # Patch metrics (texture coordinates and quad indices), computed
+    # once per source image and border size, shared by every NinePatch
+    # made from it.
+    _metrics = {}
+
     def __init__(self, image, border_size=6):
         """Create NinePatch cuts of an image
 
@@ -69,19 +58,29 @@ class NinePatch(object):
             texture - force cut ImageDatas to be Textures (or Regions)
         """
 
-        data = PixelData(image)
-        width = data.width
-        height = data.height
-
         # Texture dimensions after removing the 9patch outline.
-        self.width = width
-        self.height = height
+        self.width = image.width
+        self.height = image.height
 
         # Only need to retain the texture for drawing
         self.texture = image.get_texture()
 
         self.border_left = self.border_right = self.border_top = self.border_bottom = border_size
 
+        key = (self.texture.id, tuple(self.texture.tex_coords), border_size)
+        try:
+            self.tex_coords, self.indices = self._metrics[key]
+        except KeyError:
+            self.tex_coords, self.indices = self._metrics[key] = self._compute_metrics()
+
+        # Vertex list for the last rectangle drawn; see draw()
+        self.vertex_list = None
+        self.rect = None
+
+    def _compute_metrics(self):
+        width = self.width
+        height = self.height
+
         # Texture coordinates, in pixels
         u1 = 0
         v1 = 0
@@ -110,7 +109,7 @@ class NinePatch(object):
         v1, v2, v3, v4 = [v_bias + v_scale * s for s in (v1, v2, v3, v4)]
 
         # 2D texture coordinates, bottom-left to top-right
-        self.tex_coords = (
+        tex_coords = (
             u1, v1,
             u2, v1,
             u3, v1,
@@ -130,16 +129,18 @@ class NinePatch(object):
         )
 
         # Quad indices
-        self.indices = []
+        indices = []
         for y in range(3):
             for x in range(3):
-                self.indices.extend([
+                indices.extend([
                     x + y * 4,
                     (x + 1) + y * 4,
                     (x + 1) + (y + 1) * 4,
                     x + (y + 1) * 4,
                 ])
 
+        return tex_coords, indices
+
     def get_vertices(self, x, y, width, height):
         """Get 16 2D vertices for the given image region"""
         x1 = x
@@ -172,22 +173,39 @@ class NinePatch(object):
         )
 
     def draw(self, x, y, width, height):
-        """Draw the nine-patch at the given image dimensions."""
+        """Draw the nine-patch at the given image dimensions.
+
+        The geometry is kept in a vertex list, which is only updated
+        when the rectangle changes.
+        """
         width = max(width, self.width + 2)
         height = max(height, self.height + 2)
-        vertices = self.get_vertices(x, y, width, height)
+        rect = (x, y, width, height)
+        if self.vertex_list is None:
+            self.vertex_list = pyglet.graphics.vertex_list_indexed(
+                16, self.indices,
+                ('v2i', self.get_vertices(*rect)),
+                ('t2f', self.tex_coords))
+            self.rect = rect
+        elif rect != self.rect:
+            self.vertex_list.vertices[:] = self.get_vertices(*rect)
+            self.rect = rect
 
         glPushAttrib(GL_ENABLE_BIT)
         glEnable(GL_BLEND)
         glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
         glEnable(self.texture.target)
         glBindTexture(self.texture.target, self.texture.id)
-        pyglet.graphics.draw_indexed(
-            16, GL_QUADS, self.indices,
-            ('v2i', vertices),
-            ('t2f', self.tex_coords))
+        self.vertex_list.draw(GL_QUADS)
         glPopAttrib()
 
+    def delete(self):
+        """Release the cached geometry."""
+        if self.vertex_list is not None:
+            self.vertex_list.delete()
+            self.vertex_list = None
+            self.rect = None
+
     def draw_around(self, x, y, width, height):
         """Draw the nine-patch around the given content area"""
         self.draw(x - self.padding_left,
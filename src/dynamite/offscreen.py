@@ -0,0 +1,101 @@
+"""Render frames without a visible window, as fast as we can.
+
+Instead of pyglet.app.run(), which waits on real time and vsync, the
+default clock is stepped by a fixed timestep and each frame is drawn
+into an offscreen framebuffer and read back.
+"""
+
+import ctypes
+
+import pyglet.clock
+import pyglet.event
+import pyglet.image
+from pyglet import gl
+from pyglet.gl import glext_arb as glext
+
+
+class Framebuffer:
+    """An offscreen framebuffer, drawing into a texture."""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.texture = pyglet.image.Texture.create(width, height)
+
+        self.id = gl.GLuint()
+        glext.glGenFramebuffersEXT(1, ctypes.byref(self.id))
+        self.bind()
+        glext.glFramebufferTexture2DEXT(
+            glext.GL_FRAMEBUFFER_EXT,
+            glext.GL_COLOR_ATTACHMENT0_EXT,
+            self.texture.target,
+            self.texture.id,
+            0
+        )
+        status = glext.glCheckFramebufferStatusEXT(glext.GL_FRAMEBUFFER_EXT)
+        self.unbind()
+        if status != glext.GL_FRAMEBUFFER_COMPLETE_EXT:
+            raise RuntimeError(f"Couldn't create offscreen framebuffer (status {status:#x})")
+
+    def bind(self):
+        glext.glBindFramebufferEXT(glext.GL_FRAMEBUFFER_EXT, self.id)
+
+    def unbind(self):
+        glext.glBindFramebufferEXT(glext.GL_FRAMEBUFFER_EXT, 0)
+
+    def read(self):
+        """Read back the frame as RGB bytes, bottom row first."""
+        data = (ctypes.c_ubyte * (self.width * self.height * 3))()
+        gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+        gl.glReadPixels(
+            0, 0, self.width, self.height,
+            gl.GL_RGB, gl.GL_UNSIGNED_BYTE,
+            data
+        )
+        return data
+
+    def delete(self):
+        glext.glDeleteFramebuffersEXT(1, ctypes.byref(self.id))
+        self.texture.delete()
+
+
+class FixedStep:
+    """Drive pyglet's default clock by a fixed timestep, not real time."""
+
+    def __init__(self, fps):
+        self.clock = pyglet.clock.get_default()
+        self.dt = 1 / fps
+        # Carry on from the current time, so anything already
+        # scheduled still comes due when it should.
+        self.now = self.clock.time()
+        self.clock.time = self.time
+
+    def time(self):
+        return self.now
+
+    def step(self):
+        """Advance by one frame, calling anything that's due."""
+        self.now += self.dt
+        self.clock.tick(poll=True)
+
+
+def run_offscreen(window, frames, fps, on_frame):
+    """Step and draw the given number of frames offscreen.
+
+    on_frame is called with the frame number and the frame's pixels
+    (as returned by Framebuffer.read()) for every frame.
+    """
+    window.switch_to()
+    framebuffer = Framebuffer(window.width, window.height)
+    step = FixedStep(fps)
+    framebuffer.bind()
+    try:
+        for n in range(frames):
+            step.step()
+            # Skip the window's event queue, which only empties
+            # inside pyglet's event loop.
+            pyglet.event.EventDispatcher.dispatch_event(window, 'on_draw')
+            on_frame(n, framebuffer.read())
+    finally:
+        framebuffer.unbind()
+        framebuffer.delete()
@@ -0,0 +1,78 @@
+"""An on-screen overlay of performance figures.
+
+Timings are only taken while the overlay is showing, and its text is
+only rebuilt a few times a second, so it costs next to nothing.
+"""
+
+from pyglet.text import Label
+
+
+class PerfOverlay:
+    # Seconds between updates of the text
+    INTERVAL = 0.25
+
+    def __init__(self, window, clock, counts):
+        """counts() should return (name, value) pairs to show."""
+        self.window = window
+        self.clock = clock
+        self.counts = counts
+        self.visible = False
+        self.label = Label(
+            '',
+            font_size=10,
+            x=8,
+            y=window.height - 8,
+            width=300,
+            multiline=True,
+            anchor_x='left',
+            anchor_y='top',
+            color=(255, 255, 255, 255),
+        )
+        self.reset()
+
+    def reset(self):
+        self.logic_time = 0.0
+        self.logic_ticks = 0
+        self.draw_time = 0.0
+        self.frames = 0
+
+    def toggle(self):
+        self.visible = not self.visible
+        if self.visible:
+            self.reset()
+            self.update(0)
+            self.clock.schedule_interval(self.update, self.INTERVAL)
+        else:
+            self.clock.unschedule(self.update)
+
+    def add_logic(self, seconds, ticks):
+        """Note that ticks logic ticks took seconds to run."""
+        self.logic_time += seconds
+        self.logic_ticks += ticks
+
+    def add_frame(self, seconds):
+        """Note that a frame took seconds to draw."""
+        self.draw_time += seconds
+        self.frames += 1
+
+    def update(self, dt):
+        frames = self.frames or 1
+        ticks = self.logic_ticks or 1
+        lines = [
+            f"logic  {self.logic_time * 1000 / ticks:6.2f} ms/tick",
+            f"draw   {self.draw_time * 1000 / frames:6.2f} ms/frame",
+            f"ticks  {self.logic_ticks / frames:6.2f} /frame",
+        ]
+        for name, value in self.counts():
+            lines.append(f"{name:<12}{value:6}")
+        self.label.text = '\n'.join(lines)
+        self.reset()
+
+    def draw(self):
+        if self.visible:
+            self.label.draw()
+
+    def delete(self):
+        if self.visible:
+            self.clock.unschedule(self.update)
+        self.label.delete()
@@ -1,103 +1,398 @@
-import random
+import numpy as np
 import pyglet.resource
+import pyglet.graphics
+import pyglet.sprite
+from pyglet import gl
 
-from .coords import map_to_screen
+from .coords import TILE_W, TILE_H, OFFSET_X, OFFSET_Y
+from .vec2d import Vec2D
+
+
+def write_array(attr, data):
+    """Copy a numpy array into a vertex list attribute, in one go."""
+    np.ctypeslib.as_array(attr)[:] = data.ravel()
 
 
 class FlowParticles:
-    """Particles that indicate the flow of water."""
+    """Particles that indicate the flow of water.
+
+    All the ripples live in numpy arrays and are drawn from a single
+    vertex list, so each tick is a handful of array operations however
+    many ripples there are.
+    """
 
     SPEED = 0.6
     DRAGY = 0.3
     DRAGX = 0.4
 
+    # How many ripples spawn per second on a tile of moving water;
+    # still water gets half as many.
+    DENSITY = 1.0
+
+    # Ripples live for 2 seconds, so this comfortably covers a level
+    # that is all water.  Raise it along with DENSITY.
+    MAX_PARTICLES = 400
+
+    # Set to make the ripples the same every time.
+    SEED = None
+
     @classmethod
     def load(cls):
         cls.ripple = pyglet.resource.image('ripple.png')
         cls.ripple.anchor_x = cls.ripple.width * 0.5
         cls.ripple.anchor_y = 0
 
-    def __init__(self, level):
+    @staticmethod
+    def tables(width, height, get):
+        """Work out where the water is and which way it flows, for a map.
+
+        get(pos) gets the map tile at pos.  Returns the water and
+        current arrays, indexed by tile; this can be done in the
+        background.
+        """
+        water = np.zeros((width, height), dtype=bool)
+        current = np.zeros((width, height, 2))
+        for x in range(width):
+            for y in range(height):
+                t = get(Vec2D(x, y))
+                if t.water:
+                    water[x, y] = True
+                    current[x, y] = tuple(t.current)
+        return water, current
+
+    def __init__(self, level, tables=None):
         self.level = level
         self.batch = pyglet.graphics.Batch()
-        self.particles = []
+        self.rng = np.random.RandomState(self.SEED)
+
+        # The tiles don't change over the life of a level,
+        # so work out where the water is just the once.
+        if tables is None:
+            tables = self.tables(level.width, level.height, level.get)
+        self.water, self.current = tables
+        self.water_tiles = np.argwhere(self.water)
+        tile_current = self.current[self.water]
+        self.spawn_range = np.where(tile_current.any(axis=1), 1.0, 2.0)
+        self.tile_current = tile_current
+
+        n = self.MAX_PARTICLES
+        self.alive = np.zeros(n, dtype=bool)
+        self.pos = np.zeros((n, 2))
+        self.vel = np.zeros((n, 2))
+        self.age = np.zeros(n)
+        self.bright = np.zeros(n)
+        self.max_scale = np.zeros(n)
+
+        texture = self.ripple.get_texture()
+        group = pyglet.sprite.SpriteGroup(
+            texture,
+            gl.GL_SRC_ALPHA,
+            gl.GL_ONE_MINUS_SRC_ALPHA
+        )
+        self.vertex_list = self.batch.add(
+            n * 4, gl.GL_QUADS, group,
+            'v2i/stream',
+            'c4B/stream',
+            ('t3f/static', texture.tex_coords * n)
+        )
+        self.vertices = np.zeros((n, 4, 2), dtype=np.int32)
+        self.colors = np.full((n, 4, 4), 255, dtype=np.uint8)
+
         for _ in range(5):
             self.update(0.3)
 
+    @property
+    def particles(self):
+        """The number of ripples currently alive."""
+        return int(np.count_nonzero(self.alive))
+
     def update(self, dt):
-        water_tiles = {}
-        for pos in self.level.coords():
-            t = self.level.get(pos)
-            if t.water:
-                water_tiles[pos] = t.current
-
-        new_particles = []
-        for p in self.particles:
-            p.age += dt
-            if p.age > 2:
-                continue
+        alive = self.alive
+
+        # Integrate the ripples we already have.
+        self.age[alive] += dt
+        alive &= self.age <= 2
+
+        tile = np.rint(self.pos).astype(int)
+        tx = tile[:, 0]
+        ty = tile[:, 1]
+        in_level = (
+            (tx >= 0) & (tx < self.water.shape[0]) &
+            (ty >= 0) & (ty < self.water.shape[1])
+        )
+        tx = np.where(in_level, tx, 0)
+        ty = np.where(in_level, ty, 0)
+        alive &= in_level & self.water[tx, ty]
+
+        frac = np.array([self.DRAGX ** dt, self.DRAGY ** dt])
+        current = self.current[tx[alive], ty[alive]]
+        self.vel[alive] = frac * self.vel[alive] + (1.0 - frac) * current
+        self.pos[alive] += self.vel[alive] * (dt * self.SPEED)
+
+        # Spawn new ones.
+        rng = self.rng
+        spawning = rng.uniform(0, self.spawn_range) <= dt * self.DENSITY
+        free = np.flatnonzero(~alive)
+        tiles = self.water_tiles[spawning][:len(free)]
+        currents = self.tile_current[spawning][:len(free)]
+        k = len(tiles)
+        if k:
+            slots = free[:k]
+            alive[slots] = True
+            self.age[slots] = 0
+            self.bright[slots] = rng.uniform(128, 255, k)
+            self.vel[slots] = currents + rng.uniform(
+                (-0.5, -0.2), (0.5, 0.2), (k, 2)
+            )
+            self.max_scale[slots] = rng.uniform(0.3, 0.6, k)
+            self.pos[slots] = tiles + rng.uniform(-0.5, 0.5, (k, 2))
+
+        self.update_vertices()
+
+    def update_vertices(self):
+        """Write every ripple's quad and colour into the vertex list."""
+        age = self.age
+        fade = np.where(age < 1, age, 2 - age)
+        opacity = np.clip(fade * self.bright, 0, 255)
+        scale_x = self.max_scale
+        scale_y = fade * 0.8 * self.max_scale + 0.2
+
+        img = self.ripple
+        sx = self.pos[:, 0] * TILE_W + OFFSET_X
+        sy = OFFSET_Y - self.pos[:, 1] * TILE_H
+        x1 = sx - img.anchor_x * scale_x
+        y1 = sy - img.anchor_y * scale_y
+        x2 = x1 + img.width * scale_x
+        y2 = y1 + img.height * scale_y
+
+        v = self.vertices
+        v[:, 0, 0] = x1
+        v[:, 0, 1] = y1
+        v[:, 1, 0] = x2
+        v[:, 1, 1] = y1
+        v[:, 2, 0] = x2
+        v[:, 2, 1] = y2
+        v[:, 3, 0] = x1
+        v[:, 3, 1] = y2
+        v[~self.alive] = 0
+        self.colors[:, :, 3] = opacity[:, np.newaxis]
+
+        write_array(self.vertex_list.vertices, v)
+        write_array(self.vertex_list.colors, self.colors)
+
+    def draw(self):
+        self.batch.draw()
+
+
+class ParticleSystem:
+    """3D-ish particle effects, simulated all together.
 
-            if p.age < 1:
-                p.opacity = p.age * p.bright
-                p.scale_y = p.age * p.max_scale * 0.8 + 0.2
-            elif p.age > 1:
-                p.opacity = (2 - p.age) * p.bright
-                p.scale_y = (2 - p.age) * 0.8 * p.max_scale + 0.2
+    Each particle has a position on the map, a height z above it, a
+    velocity, a spin, drag and gravity.  These are kept as a structure
+    of arrays, packed at the front, and stepped in a single scheduled
+    update.  Each image gets its own vertex list, rewritten in bulk.
 
-            x, y = p.map_pos
-            current = water_tiles.get((round(x), round(y)))
-            if current is None:
+    The update is only scheduled while there are particles in flight.
+    """
+
+    INITIAL_CAPACITY = 64
+
+    FIELDS = [
+        ('kind', np.intp),
+        ('x', float),
+        ('y', float),
+        ('z', float),
+        ('vx', float),
+        ('vy', float),
+        ('vz', float),
+        ('rotation', float),
+        ('va', float),
+        ('drag', float),
+        ('gravity', float),
+    ]
+
+    def __init__(self, sprites, clock, on_landed=None):
+        """Create a particle system for the given images.
+
+        on_landed, if given, is called with the image name and map
+        position of each particle that falls back to the ground.
+        """
+        self.names = list(sprites)
+        self.images = [sprites[name] for name in self.names]
+        self.kinds = {name: i for i, name in enumerate(self.names)}
+        self.clock = clock
+        self.on_landed = on_landed
+        self.batch = pyglet.graphics.Batch()
+
+        self.count = 0
+        self.capacity = 0
+        self._grow(self.INITIAL_CAPACITY)
+
+        # Per image: a vertex list, how many quads it has room for,
+        # and how many of them we wrote last time.
+        self.vertex_lists = [None] * len(self.names)
+        self.room = [0] * len(self.names)
+        self.drawn = [0] * len(self.names)
+        self.scheduled = False
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self, capacity):
+        for name, dtype in self.FIELDS:
+            a = np.zeros(capacity, dtype=dtype)
+            if self.count:
+                a[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, a)
+        self.capacity = capacity
+
+    def emit(self, sprite_name, position, vx, vy, z, vz, rotation, va, drag=1.0, gravity=-100):
+        """Add particles of one image, starting at position.
+
+        The per-particle arguments are sequences of equal length.
+        """
+        n = len(vx)
+        if not n:
+            return
+        needed = self.count + n
+        if needed > self.capacity:
+            capacity = self.capacity
+            while capacity < needed:
+                capacity *= 2
+            self._grow(capacity)
+
+        s = slice(self.count, needed)
+        self.kind[s] = self.kinds[sprite_name]
+        self.x[s], self.y[s] = position
+        self.z[s] = z
+        self.vx[s] = vx
+        self.vy[s] = vy
+        self.vz[s] = vz
+        self.rotation[s] = rotation
+        self.va[s] = va
+        self.drag[s] = drag
+        self.gravity[s] = gravity
+        self.count = needed
+
+        if not self.scheduled:
+            self.clock.schedule(self.update)
+            self.scheduled = True
+
+    def clear(self):
+        self.count = 0
+        self.write_vertices()
+        if self.scheduled:
+            self.clock.unschedule(self.update)
+            self.scheduled = False
+
+    def update(self, dt):
+        n = self.count
+        drag = self.drag[:n] ** dt
+
+        vz = self.vz[:n]
+        vz *= drag
+        vz += self.gravity[:n] * dt
+        self.z[:n] += vz * dt
+
+        flying = self.z[:n] >= 0
+        landed = []
+        if self.on_landed and not flying.all():
+            landed = [
+                (self.names[k], (x, y))
+                for k, x, y in zip(
+                    self.kind[:n][~flying].tolist(),
+                    self.x[:n][~flying].tolist(),
+                    self.y[:n][~flying].tolist(),
+                )
+            ]
+
+        self.vx[:n] *= drag
+        self.vy[:n] *= drag
+        self.x[:n] += self.vx[:n] * dt
+        self.y[:n] += self.vy[:n] * dt
+        self.rotation[:n] += self.va[:n] * dt
+
+        if not flying.all():
+            self.count = int(np.count_nonzero(flying))
+            for name, _ in self.FIELDS:
+                a = getattr(self, name)
+                a[:self.count] = a[:n][flying]
+
+        self.write_vertices()
+
+        if not self.count and self.scheduled:
+            self.clock.unschedule(self.update)
+            self.scheduled = False
+
+        for name, position in landed:
+            self.on_landed(name, position)
+
+    def write_vertices(self):
+        """Write every particle's quad into its image's vertex list."""
+        n = self.count
+        kind = self.kind[:n]
+        for k, img in enumerate(self.images):
+            if not n and not self.drawn[k]:
                 continue
-            curx, cury = current
-
-            vx, vy = p.v
-
-            frac = self.DRAGX ** dt
-            invfrac = 1.0 - frac
-            vx = frac * vx + invfrac * curx
-            frac = self.DRAGY ** dt
-            invfrac = 1.0 - frac
-            vy = frac * vy + invfrac * cury
-
-            p.v = vx, vy
-            spd = dt * self.SPEED
-            x += vx * spd
-            y += vy * spd
-            p.map_pos = x, y
-            p.position = map_to_screen(p.map_pos)
-            new_particles.append(p)
-
-        for (tx, ty), current in water_tiles.items():
-            cx, cy = current
-            f = cx + cy
-
-            if random.uniform(0, 1 if f else 2) > dt:
+            idx = np.flatnonzero(kind == k)
+            m = len(idx)
+            if not m and not self.drawn[k]:
                 continue
-            x = random.uniform(tx - 0.5, tx + 0.5)
-            y = random.uniform(ty - 0.5, ty + 0.5)
-
-            map_pos = x, y
-            sx, sy = map_to_screen(map_pos)
-            p = pyglet.sprite.Sprite(
-                self.ripple,
-                sx,
-                sy,
-                batch=self.batch
+            if m > self.room[k]:
+                self._make_room(k, m)
+
+            # Same as pyglet.sprite.Sprite._update_position()
+            # for a rotated sprite.
+            x1 = -img.anchor_x
+            y1 = -img.anchor_y
+            x2 = x1 + img.width
+            y2 = y1 + img.height
+            x = self.x[idx] * TILE_W + OFFSET_X
+            y = OFFSET_Y - self.y[idx] * TILE_H + self.z[idx]
+            r = -np.radians(self.rotation[idx])
+            cr = np.cos(r)
+            sr = np.sin(r)
+
+            v = np.empty((m, 4, 2), dtype=np.int32)
+            v[:, 0, 0] = x1 * cr - y1 * sr + x
+            v[:, 0, 1] = x1 * sr + y1 * cr + y
+            v[:, 1, 0] = x2 * cr - y1 * sr + x
+            v[:, 1, 1] = x2 * sr + y1 * cr + y
+            v[:, 2, 0] = x2 * cr - y2 * sr + x
+            v[:, 2, 1] = x2 * sr + y2 * cr + y
+            v[:, 3, 0] = x1 * cr - y2 * sr + x
+            v[:, 3, 1] = x1 * sr + y2 * cr + y
+
+            vertices = np.ctypeslib.as_array(self.vertex_lists[k].vertices)
+            vertices[:m * 8] = v.ravel()
+            vertices[m * 8:self.drawn[k] * 8] = 0
+            self.drawn[k] = m
+
+    def _make_room(self, k, m):
+        room = max(self.room[k], 16)
+        while room < m:
+            room *= 2
+        img = self.images[k]
+        vl = self.vertex_lists[k]
+        if vl is None:
+            texture = img.get_texture()
+            group = pyglet.sprite.SpriteGroup(
+                texture,
+                gl.GL_SRC_ALPHA,
+                gl.GL_ONE_MINUS_SRC_ALPHA
             )
-            p.age = 0
-            p.bright = random.uniform(128, 255)
-            cx, cy = current
-            p.v = (
-                cx + random.uniform(-0.5, 0.5),
-                cy + random.uniform(-0.2, 0.2)
+            vl = self.vertex_lists[k] = self.batch.add(
+                room * 4, gl.GL_QUADS, group,
+                'v2i/stream',
+                'c4B/static',
+                't3f/static',
             )
-            p.opacity = 0
-            p.max_scale = random.uniform(0.3, 0.6)
-            p.scale_x = p.max_scale
-            p.scale_y = 0.2
-            p.map_pos = map_pos
-            new_particles.append(p)
-        self.particles = new_particles
+        else:
+            vl.resize(room * 4)
+        vl.colors[:] = (255,) * (room * 16)
+        vl.tex_coords[:] = img.get_texture().tex_coords * room
+        np.ctypeslib.as_array(vl.vertices)[self.drawn[k] * 8:] = 0
+        self.room[k] = room
 
     def draw(self):
         self.batch.draw()
@@ -2,35 +2,57 @@ import math
 import random
 import copy
 
-from pyglet import gl
-from pyglet import clock
+import pyglet.clock
 import pyglet.resource
 import pyglet.graphics
 import pyglet.sprite
 
+from . import assets
+from . import clocks
+from . import metrics
 from .coords import map_to_screen
-from .vec2d import Vec2D
+from .particles import ParticleSystem
+
+
+particles_spawned = metrics.counter(
+    'particles_spawned_total',
+    "Particles spawned by explosions and splashes",
+)
+explosion_pool_misses = metrics.counter(
+    'explosion_pool_misses_total',
+    "Explosions that found their pool empty and had to be created",
+)
+explosion_pool_peak = metrics.gauge(
+    'explosion_pool_peak_in_use',
+    "Most explosions of one scene's pool in use at once",
+)
 
 
 class Scene:
     def __init__(self):
         self.objects = set()
         self.batch = pyglet.graphics.Batch()
-        self.clock = clock
+        self.clock = clocks.game
 
-        Static.load()
-        Bomb.load()
-        Player.load()
-        Explosion.load()
-        Particle.load()
+        assets.require('scene')
+
+        self.particles = ParticleSystem(
+            Particle.sprites,
+            self.clock,
+            on_landed=self.on_particle_landed,
+        )
+        self.explosions = ExplosionPool(self)
 
     def clear(self):
         self.objects.clear()
         self.batch = pyglet.graphics.Batch()
+        self.particles.clear()
+        self.explosions = ExplosionPool(self)
 
     def draw(self):
         self.batch.invalidate()
         self.batch.draw()
+        self.particles.draw()
 
     def spawn_static(self, position, sprite):
         return Static(self, position, sprite)
@@ -42,7 +64,7 @@ class Scene:
         return Player(self, position, sprite)
 
     def spawn_explosion(self, position, freeze=False):
-        Explosion(self, position, freeze=freeze)
+        self.explosions.spawn(position, freeze=freeze)
         if freeze:
             self.spawn_particles(
                 15,
@@ -57,6 +79,13 @@ class Scene:
             )
 
     def spawn_particles(self, num, sprite_name, position, zrange, speed, vzrange, va, drag=1.0, gravity=-100):
+        particles_spawned.inc(num)
+        vxs = []
+        vys = []
+        zs = []
+        vzs = []
+        rotations = []
+        vas = []
         for _ in range(num):
             # Choose a random angle anywhere in the circle
             angle = random.uniform(0, math.tau)
@@ -64,24 +93,31 @@ class Scene:
             radius = math.sqrt(random.uniform(0, 1))
 
             # Convert angle/radius to a cartesian vector
-            vx = speed * radius * math.sin(angle)
-            vy = speed * radius * math.cos(angle)
-            z = random.uniform(*zrange)
-            vz = random.uniform(*vzrange)
+            vxs.append(speed * radius * math.sin(angle))
+            vys.append(speed * radius * math.cos(angle))
+            zs.append(random.uniform(*zrange))
+            vzs.append(random.uniform(*vzrange))
             if random.randint(0, 1) == 1:
                 va = -va
+            vas.append(va)
+            rotations.append(random.randrange(360))
 
-            Particle(
-                self,
-                position,
-                sprite_name,
-                (vx, vy),
-                z,
-                vz,
-                va,
-                drag,
-                gravity
-            )
+        self.particles.emit(
+            sprite_name,
+            position,
+            vxs,
+            vys,
+            zs,
+            vzs,
+            rotations,
+            vas,
+            drag,
+            gravity
+        )
+
+    def on_particle_landed(self, sprite_name, position):
+        if 'bomb' in sprite_name:
+            self.spawn_explosion(position, 'freeze' in sprite_name)
 
 
 class AnchoredImg:
@@ -157,28 +193,43 @@ class ActorGroup(pyglet.graphics.OrderedGroup):
         return self is ano
 
 
-class AttachmentGroup(pyglet.graphics.Group):
-    def __init__(self, obj, parent):
-        super().__init__(parent)
-        self.obj = obj
+class AttachedSprite(pyglet.sprite.Sprite):
+    """A sprite whose position is relative to another sprite.
 
-    def set_state(self):
-        gl.glMatrixMode(gl.GL_MODELVIEW)
-        gl.glPushMatrix()
-        x, y = self.obj.position
-        gl.glTranslatef(x, y, 0)
+    Rather than pushing a translation onto the modelview matrix while
+    drawing, the parent's position is folded into our vertices whenever
+    either of us moves, so attachments batch along with everything else.
+    """
+    def __init__(self, img, parent, x=0, y=0, **kwargs):
+        self.origin = parent.position
+        super().__init__(img, x, y, **kwargs)
 
-    def unset_state(self):
-        gl.glMatrixMode(gl.GL_MODELVIEW)
-        gl.glPopMatrix()
+    def move_origin(self, origin):
+        self.origin = origin
+        self._update_position()
 
-    def __lt__(self, ano):
-        return False
+    def _update_position(self):
+        x, y = self._x, self._y
+        ox, oy = self.origin
+        self._x = x + ox
+        self._y = y + oy
+        super()._update_position()
+        self._x, self._y = x, y
 
 
 class Actor:
     DEFAULT_Z = 0
 
+    @classmethod
+    def image_filenames(cls):
+        """Get the filenames of the images our sprites are made from."""
+        filenames = []
+        for spr in cls.SPRITES:
+            if isinstance(spr, AnchoredImg):
+                spr = spr.image_filename
+            filenames.append(f'{spr}.png')
+        return list(dict.fromkeys(filenames))
+
     @classmethod
     def load(cls):
         if hasattr(cls, 'sprites'):
@@ -206,7 +257,7 @@ class Actor:
             group=pyglet.graphics.OrderedGroup(0, self.group),
             batch=scene.batch,
         )
-        self.attach_group = AttachmentGroup(self.sprite, self.group)
+        self.attach_group = pyglet.graphics.OrderedGroup(1, self.group)
         self.anim = sprite_name
 
         self.scene = scene
@@ -235,6 +286,8 @@ class Actor:
             return
         self.sprite.position = x, y + self._z
         self.group.order = self.z_order()
+        for spr in self.attached:
+            spr.move_origin(self.sprite.position)
 
     @property
     def z(self):
@@ -256,8 +309,9 @@ class Actor:
 
     def attach(self, img, x, y):
         """Attach another sprite on top of this."""
-        sprite = pyglet.sprite.Sprite(
+        sprite = AttachedSprite(
             img,
+            self.sprite,
             x=x,
             y=y,
             group=self.attach_group,
@@ -439,12 +493,96 @@ class Explosion(Actor):
             anchor_y=39,
         ),
     ]
-    def __init__(self, scene, position, freeze=False):
+    def __init__(self, scene, pool, freeze=False):
+        """Do not use this constructor - use Scene.spawn_explosion()."""
         sprite = 'explosion-freeze' if freeze else 'explosion'
-        super().__init__(scene, position, sprite)
-        self.sprite.on_animation_end = self.delete
+        super().__init__(scene, (0, 0), sprite)
+        self.pool = pool
+        self.freeze = freeze
+        self.active = False
+        self.sprite.on_animation_end = self.finish
         self.sprite.scale = 2.0
 
+        # Sit idle until we're spawned.  There's no public way to stop
+        # a sprite's animation, so unschedule its internal callback,
+        # which pyglet always puts on its default clock.
+        pyglet.clock.unschedule(self.sprite._animate)
+        self.sprite.visible = False
+        self.scene.objects.remove(self)
+
+    def start(self, position):
+        """Play the explosion from the first frame at position."""
+        self.active = True
+        self.scene.objects.add(self)
+        self.position = position
+        self.sprite.image = self.sprites[self.anim]
+        self.sprite.visible = True
+
+    def finish(self):
+        """Hide the explosion and hand it back to the pool."""
+        if not self.active:
+            return
+        self.active = False
+        self.sprite.visible = False
+        self.scene.objects.remove(self)
+        self.pool.release(self)
+
+
+class ExplosionPool:
+    """Explosion actors, recycled rather than created for every blast.
+
+    SIZE of each kind are made up front.  If a chain reaction needs
+    more than that, extra ones are made and kept; "misses" counts how
+    often that happened, so SIZE can be tuned.  The counts are shown on
+    the performance overlay, and the session's totals exported as
+    metrics.
+    """
+    SIZE = 8
+
+    def __init__(self, scene):
+        self.scene = scene
+        self.free = {False: [], True: []}
+        self.created = 0
+        self.in_use = 0
+        self.high_water = 0
+        self.misses = 0
+        for freeze, free in self.free.items():
+            for _ in range(self.SIZE):
+                free.append(self._create(freeze))
+
+    def _create(self, freeze):
+        self.created += 1
+        return Explosion(self.scene, self, freeze=freeze)
+
+    def spawn(self, position, freeze=False):
+        free = self.free[freeze]
+        if free:
+            explosion = free.pop()
+        else:
+            self.misses += 1
+            explosion_pool_misses.inc()
+            explosion = self._create(freeze)
+        self.in_use += 1
+        if self.in_use > self.high_water:
+            self.high_water = self.in_use
+            if self.in_use > explosion_pool_peak.value:
+                explosion_pool_peak.set(self.in_use)
+        explosion.start(position)
+        return explosion
+
+    def release(self, explosion):
+        self.in_use -= 1
+        self.free[explosion.freeze].append(explosion)
+
+    def stats(self):
+        """Pool-size counters, for tuning and instrumentation."""
+        return {
+            'size': self.created,
+            'in_use': self.in_use,
+            'high_water': self.high_water,
+            'misses': self.misses,
+        }
+
 
 class Static(Actor):
     """All static objects can go here."""
@@ -467,7 +605,10 @@ class Static(Actor):
 
 
 class Particle(Actor):
-    """3D-ish particle effects."""
+    """Images for the 3D-ish particle effects.
+
+    The particles themselves are simulated by the scene's ParticleSystem.
+    """
     SPRITES = [
         AnchoredImg('timed-bomb', anchor_x=21, anchor_y=21),
         AnchoredImg('freeze-bomb', anchor_x=21, anchor_y=21),
@@ -478,44 +619,11 @@ class Particle(Actor):
         'snowflake',
     ]
 
-    def __init__(
-            self,
-            scene,
-            position,
-            sprite_name,
-            vxy,
-            z,
-            vz,
-            va,
-            drag=1.0,
-            gravity=-100):
-        super().__init__(scene, position, sprite_name)
-        self.vxy = Vec2D(vxy)
-        self.sprite.rotation = random.randrange(360)
-        self.z = z
-        self.vz = vz
-        self.va = va
-        self.drag = drag
-        self.gravity = gravity
-        self.scene.clock.schedule(self.update)
-
-    def update(self, dt):
-        self.vz = self.vz * self.drag ** dt + self.gravity * dt
-        self.z += self.vz * dt
-
-        if self.z < 0:
-            if 'bomb' in self.anim:
-                self.scene.spawn_explosion(
-                    self.position,
-                    'freeze' in self.anim
-                )
-            self.delete()
-            return
-
-        self.vxy *= self.drag ** dt
-        self.position += self.vxy * dt
-        self.sprite.rotation += self.va * dt
 
-    def delete(self):
-        self.scene.clock.unschedule(self.update)
-        super().delete()
+for cls in (Static, Bomb, Player, Explosion, Particle):
+    assets.declare_images(
+        f'sprites/{cls.__name__}',
+        cls.image_filenames(),
+        cls.load,
+        group='scene',
+    )
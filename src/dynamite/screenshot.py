@@ -0,0 +1,105 @@
+"""Take screenshots without stalling the game.
+
+Reading back the frame is started on the GPU when the screenshot is
+taken, and--where pixel buffer objects are available--collected a
+frame later, once it has finished.  The pixels are then encoded as PNG
+and written out on a worker thread.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import ctypes
+import datetime
+from pathlib import Path
+import re
+
+from pyglet import gl
+import pyglet.image
+
+
+class Screenshots:
+    def __init__(self, clock, directory=None):
+        self.clock = clock
+        self.directory = Path(directory or Path.cwd() / 'grabs')
+        self.number = None
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.free_buffers = []
+        self.pending = []
+        self.use_pbo = (
+            gl.gl_info.have_version(2, 1)
+            or gl.gl_info.have_extension('GL_ARB_pixel_buffer_object')
+        )
+
+    def next_path(self):
+        """Get the filename for the next screenshot.
+
+        The grabs directory is only looked at the first time;
+        after that we just count.
+        """
+        day = (datetime.date.today() - datetime.date(2018, 10, 20)).days
+        if self.number is None:
+            self.directory.mkdir(exist_ok=True)
+            self.day = day
+            self.number = self._last_number(day)
+        elif day != self.day:
+            self.day = day
+            self.number = self._last_number(day)
+        self.number += 1
+        return self.directory / f'day{day}-{self.number}.png'
+
+    def _last_number(self, day):
+        pattern = re.compile(rf'day{day}-(\d+)\.png$')
+        numbers = [0]
+        for path in self.directory.iterdir():
+            mo = pattern.match(path.name)
+            if mo:
+                numbers.append(int(mo.group(1)))
+        return max(numbers)
+
+    def capture(self, x, y, width, height):
+        """Screenshot the given area of the current frame.
+
+        Call this after drawing, before the frame is flipped.
+        """
+        path = self.next_path()
+        size = width * height * 3
+        gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+        if not self.use_pbo:
+            data = (ctypes.c_ubyte * size)()
+            gl.glReadPixels(x, y, width, height, gl.GL_RGB, gl.GL_UNSIGNED_BYTE, data)
+            self.executor.submit(self.save, path, width, height, data)
+            return path
+
+        if self.free_buffers:
+            buffer = self.free_buffers.pop()
+        else:
+            buffer = gl.GLuint()
+            gl.glGenBuffers(1, ctypes.byref(buffer))
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, buffer)
+        gl.glBufferData(gl.GL_PIXEL_PACK_BUFFER, size, None, gl.GL_STREAM_READ)
+        gl.glReadPixels(x, y, width, height, gl.GL_RGB, gl.GL_UNSIGNED_BYTE, 0)
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+        if not self.pending:
+            self.clock.schedule_once(self.collect, 0)
+        self.pending.append((buffer, path, width, height))
+        return path
+
+    def collect(self, dt):
+        """Copy finished readbacks out of their pixel buffers."""
+        for buffer, path, width, height in self.pending:
+            size = width * height * 3
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, buffer)
+            p = gl.glMapBuffer(gl.GL_PIXEL_PACK_BUFFER, gl.GL_READ_ONLY)
+            if p:
+                data = (ctypes.c_ubyte * size)()
+                ctypes.memmove(data, p, size)
+                gl.glUnmapBuffer(gl.GL_PIXEL_PACK_BUFFER)
+                self.executor.submit(self.save, path, width, height, data)
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+            self.free_buffers.append(buffer)
+        self.pending.clear()
+
+    @staticmethod
+    def save(path, width, height, data):
+        """Encode and write a screenshot.  Runs on the worker thread."""
+        image = pyglet.image.ImageData(width, height, 'RGB', bytes(data), width * 3)
+        image.save(str(path))
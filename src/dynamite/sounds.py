@@ -0,0 +1,279 @@
+"""Sound effects and music.
+
+Sound effects are kept in an on-disk cache as raw PCM in the mixer's
+format (44.1kHz, 16-bit, stereo), so once a sound has been converted it
+never needs decoding, resampling or converting again.  The cache files
+are memory-mapped when a sound is first needed, on a worker thread;
+creating the pygame.mixer.Sound is then just a copy.
+
+The first time round, WAV files that are already at the mixer's rate
+and sample size are converted on the worker thread; anything else is
+left for SDL to load and convert, and what it produces is cached.
+
+Effects are played through a SoundManager, which limits how many voices
+each one can have, and coalesces repeats of the same effect in a frame.
+
+Music is streamed by pygame.mixer.music, a buffer at a time, rather
+than decoded up front.
+"""
+
+import heapq
+import itertools
+import mmap
+import os
+from pathlib import Path
+import struct
+import wave
+
+import numpy as np
+import pygame.mixer
+import pyglet.resource
+
+from . import assets
+
+
+FREQUENCY = 44100
+SIZE = -16
+CHANNELS = 2
+# Samples per mixer buffer; this also bounds how much music is decoded
+# ahead of playback.
+BUFFER = 2048
+
+CACHE_DIR = Path(__file__).parent.parent / 'cache' / 'sounds'
+CACHE_MAGIC = b'DVPCM01\n'
+# magic, frequency, size, channels, stamp length
+CACHE_HEADER = struct.Struct('<8siiiI')
+
+
+def pre_init():
+    """Set the mixer format.  Call before pygame.mixer.init()."""
+    pygame.mixer.pre_init(
+        frequency=FREQUENCY,
+        size=SIZE,
+        channels=CHANNELS,
+        buffer=BUFFER
+    )
+
+
+def decode_wav(filename):
+    """Decode a WAV resource into a buffer for pygame.mixer.Sound, if we can.
+
+    Returns None if it needs converting by SDL.
+    """
+    init = pygame.mixer.get_init()
+    if not init:
+        return None
+    frequency, size, channels = init
+    with pyglet.resource.file(filename) as f, wave.open(f, 'rb') as w:
+        if w.getframerate() != frequency or w.getsampwidth() != 2 or size != -16:
+            return None
+        file_channels = w.getnchannels()
+        data = w.readframes(w.getnframes())
+
+    samples = np.frombuffer(data, dtype='<i2').reshape(-1, file_channels)
+    if file_channels != channels:
+        if file_channels != 1:
+            return None
+        samples = np.repeat(samples, channels, axis=1)
+    return samples.tobytes()
+
+
+def source_stamp(filename):
+    """Identify the version of a resource, to tell if the cache is stale.
+
+    This is the size and mtime of the file it comes from--which for
+    anything in the asset pack, is the pack.
+    """
+    location = pyglet.resource.location(filename)
+    if isinstance(location, pyglet.resource.FileLocation):
+        path = os.path.join(location.path, filename)
+    else:
+        path = getattr(getattr(location, 'pack', None), 'path', None)
+        if path is None:
+            return None
+    st = os.stat(path)
+    return f'{st.st_size}:{st.st_mtime_ns}'.encode('ascii')
+
+
+def cache_path(filename):
+    return CACHE_DIR / (filename.replace('/', '_') + '.pcm')
+
+
+def read_cache(filename):
+    """Map a sound's cached PCM, if it's there and up to date.
+
+    Returns a memoryview of the samples, or None.
+    """
+    init = pygame.mixer.get_init()
+    stamp = source_stamp(filename)
+    if not init or stamp is None:
+        return None
+    try:
+        with open(cache_path(filename), 'rb') as f:
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        magic, *format, stamp_len = CACHE_HEADER.unpack_from(m)
+    except struct.error:
+        return None
+    start = CACHE_HEADER.size + stamp_len
+    if (magic != CACHE_MAGIC
+            or tuple(format) != tuple(init)
+            or m[CACHE_HEADER.size:start] != stamp):
+        return None
+    return memoryview(m)[start:]
+
+
+def write_cache(filename, data):
+    """Save a sound's PCM, in the mixer's current format, to the cache."""
+    init = pygame.mixer.get_init()
+    stamp = source_stamp(filename)
+    if not init or stamp is None:
+        return
+    path = cache_path(filename)
+    tmp = path.with_suffix('.tmp')
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(tmp, 'wb') as f:
+            f.write(CACHE_HEADER.pack(CACHE_MAGIC, *init, len(stamp)))
+            f.write(stamp)
+            f.write(data)
+        os.replace(tmp, path)
+    except OSError:
+        # The cache is only an optimisation
+        pass
+
+
+def decode(filename):
+    """Get PCM for a sound, from the cache or the WAV.  Runs on a worker."""
+    data = read_cache(filename)
+    if data is None:
+        data = decode_wav(filename)
+        if data is not None:
+            write_cache(filename, data)
+    return data
+
+
+def make_sound(filename, data):
+    if data is None:
+        with pyglet.resource.file(filename) as f:
+            sound = pygame.mixer.Sound(file=f)
+        write_cache(filename, sound.get_raw())
+        return sound
+    return pygame.mixer.Sound(buffer=data)
+
+
+class Effect:
+    """A sound effect, and how the SoundManager should play it.
+
+    voices is the most copies of it that can play at once, and
+    priority decides which effects get a channel when they run out.
+    """
+
+    def __init__(self, asset, voices=2, priority=0):
+        self.asset = asset
+        self.voices = voices
+        self.priority = priority
+
+    def __repr__(self):
+        return f"<Effect {self.asset.name}>"
+
+    @property
+    def sound(self):
+        return self.asset.get()
+
+
+def declare(name, filename, group=None, voices=2, priority=0):
+    """Declare a sound effect, from a WAV resource."""
+    asset = assets.declare(
+        f'sounds/{name}',
+        lambda data: make_sound(filename, data),
+        group,
+        decode=lambda: decode(filename),
+    )
+    return Effect(asset, voices, priority)
+
+
+class SoundManager:
+    """Play sound effects, a frame at a time.
+
+    Effects asked for between updates are played together when update()
+    is called, with any number of requests for the same effect coalesced
+    into one.  Delayed effects wait in a queue until their time comes.
+
+    When an effect is already playing on as many voices as it's
+    allowed, its oldest voice is restarted.  When all the mixer's
+    channels are busy, a lower-priority effect is cut off to make room,
+    or if there isn't one, the new effect is dropped.
+    """
+
+    def __init__(self, channels=16):
+        pygame.mixer.set_num_channels(channels)
+        self.channels = [pygame.mixer.Channel(i) for i in range(channels)]
+        # channel index -> (effect, priority, time started)
+        self.playing = {}
+        # effect -> priority, to be played on the next update
+        self.pending = {}
+        # heap of (time, sequence, effect, priority)
+        self.delayed = []
+        self.sequence = itertools.count()
+        self.time = 0.0
+
+    def play(self, effect, delay=0, priority=None):
+        """Play an effect on the next update, or delay seconds later."""
+        if priority is None:
+            priority = effect.priority
+        if delay:
+            t = self.time + delay
+            heapq.heappush(self.delayed, (t, next(self.sequence), effect, priority))
+            return
+        self.pending[effect] = max(priority, self.pending.get(effect, priority))
+
+    def update(self, dt):
+        """Move time on by dt seconds, and play everything that's due."""
+        self.time += dt
+        while self.delayed and self.delayed[0][0] <= self.time:
+            _, _, effect, priority = heapq.heappop(self.delayed)
+            self.play(effect, priority=priority)
+        if not self.pending:
+            return
+        pending = sorted(self.pending.items(), key=lambda item: -item[1])
+        self.pending.clear()
+        for effect, priority in pending:
+            self._start(effect, priority)
+
+    def _start(self, effect, priority):
+        for i in list(self.playing):
+            if not self.channels[i].get_busy():
+                del self.playing[i]
+
+        voices = [i for i, (e, _, _) in self.playing.items() if e is effect]
+        if len(voices) >= effect.voices:
+            index = min(voices, key=lambda i: self.playing[i][2])
+        else:
+            index = self._free_channel(priority)
+            if index is None:
+                return
+        self.channels[index].play(effect.sound)
+        self.playing[index] = (effect, priority, self.time)
+
+    def _free_channel(self, priority):
+        for i in range(len(self.channels)):
+            if i not in self.playing:
+                return i
+        # Cut off the oldest of the lowest-priority effects, if it's
+        # lower than ours
+        index = min(
+            self.playing,
+            key=lambda i: (self.playing[i][1], self.playing[i][2])
+        )
+        if self.playing[index][1] < priority:
+            return index
+        return None
+
+
+def play_music(path, loops=-1):
+    """Stream music from a file."""
+    pygame.mixer.music.load(str(path))
+    pygame.mixer.music.play(loops=loops)
@@ -0,0 +1,67 @@
+"""Timestamps for each phase of starting up.
+
+Call mark() as each phase finishes; report() then breaks down how long
+each one took.  Phases are timed from the end of the one before, and
+the first from when the process started, where we can find that out.
+"""
+
+import os
+import time
+
+
+marks = []
+
+
+def _process_start():
+    """Get the perf_counter() time at which this process started, if we can."""
+    try:
+        with open(f'/proc/{os.getpid()}/stat') as f:
+            # the command name can contain spaces, but not ')'
+            fields = f.read().rpartition(')')[2].split()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        started = int(fields[19]) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+    return time.perf_counter() - (uptime - started)
+
+
+process_start = _process_start()
+
+
+def mark(phase, t=None):
+    """Note that a phase finished, now or at the given perf_counter() time.
+
+    Only the first mark for each phase counts.
+    """
+    if any(name == phase for name, _ in marks):
+        return
+    marks.append((phase, time.perf_counter() if t is None else t))
+
+
+def elapsed():
+    """How long it's been since we started."""
+    start = process_start if process_start is not None else marks[0][1]
+    return time.perf_counter() - start
+
+
+def report(extra=()):
+    """Break down how long each phase took.
+
+    extra is a list of (name, seconds) for work that didn't happen as a
+    phase of its own, such as loading done in the background.
+    """
+    lines = ["Startup:"]
+    if process_start is not None:
+        prev = start = process_start
+    else:
+        prev = start = marks[0][1]
+    for name, t in marks:
+        lines.append(f"  {name:<28} {(t - prev) * 1000:8.1f}ms")
+        prev = t
+    lines.append(f"  {'total':<28} {(prev - start) * 1000:8.1f}ms")
+    if extra:
+        lines.append("Also:")
+        for name, seconds in extra:
+            lines.append(f"  {name:<28} {seconds * 1000:8.1f}ms")
+    return '\n'.join(lines)
@@ -2,14 +2,16 @@ import math
 from pathlib import Path
 
 import pyglet.graphics
+import pyglet.image
 import pyglet.sprite
 from pyglet.event import EVENT_HANDLED
-from pyglet import clock
 from pyglet import gl
 from pyglet.text import Label
 import pyglet.window.key as key
 
 from . import animation
+from . import assets
+from . import clocks
 from .scene import AnchoredImg
 from .ninepatch import NinePatch
 
@@ -47,9 +49,17 @@ current_screen = None
 
 class Screen:
     SPRITES = []
+
+    # Asset groups to have loaded before the screen starts
+    ASSETS = []
     BGCOLOR = 66 / 255, 125 / 255, 193 / 255
     ended = False
 
+    # Set whenever what's on screen may have changed.  See on_draw().
+    dirty = True
+    frame = None
+    frame_valid = False
+
     def log(self, *a):
         s = " ".join(str(s) for s in a)
         # print(f"\n[{self.__class__.__name__}] #{self.serial_number} {s}\n")
@@ -70,22 +80,17 @@ class Screen:
                 handlers[k] = getattr(self, k)
         self.window = window
         self.on_finished = on_finished
+        assets.require(*self.ASSETS)
         self.load()
         self.batch = pyglet.graphics.Batch()
-        self.t = 0
-
-        self.clock = clock.Clock(time_function=self._time)
-        clock.schedule(self._tick)
+        self.clock = clocks.screens.child(type(self).__name__)
         self.start()
         self.log(">>>> push handlers >>>>")
         window.push_handlers(**handlers)
 
-    def _time(self):
-        return self.t
-
-    def _tick(self, dt):
-        self.t += dt
-        self.clock.tick(True)
+    def invalidate(self):
+        """Note that the screen needs redrawing."""
+        self.dirty = True
 
     def start(self):
         """Start the screen."""
@@ -98,7 +103,7 @@ class Screen:
         current_screen = None
         self.log("<<<< pop handlers <<<<")
         self.window.pop_handlers()
-        clock.unschedule(self._tick)
+        self.clock.remove()
         self.log(f"end() smaller, and no longer in charge.  finished handler is {self.on_finished}.")
         if self.on_finished:
             self.on_finished()
@@ -115,10 +120,63 @@ class Screen:
                 s.anchor_y = 10
 
     def on_draw(self):
+        """Draw the screen, but only if something has changed.
+
+        Once nothing has changed for a frame, that frame is copied into
+        a texture, and put back up as-is until something changes again.
+        """
+        # Anything our clock runs--tweens, scheduled callbacks--may
+        # have changed what's on screen.
+        if self.clock.changed:
+            self.clock.changed = False
+            self.dirty = True
+        if self.dirty:
+            self.dirty = False
+            self.frame_valid = False
+            self.redraw()
+        elif not self.frame_valid:
+            self.redraw()
+            self.capture_frame()
+            self.frame_valid = True
+        else:
+            self.present_frame()
+        return EVENT_HANDLED
+
+    def redraw(self):
         gl.glClearColor(*self.BGCOLOR, 0)
         self.window.clear()
+        self.draw()
+
+    def draw(self):
+        """Draw the contents of the screen."""
         self.batch.draw()
-        return EVENT_HANDLED
+
+    def capture_frame(self):
+        buffer = pyglet.image.get_buffer_manager().get_color_buffer()
+        if not self.frame:
+            self.frame = pyglet.image.Texture.create(
+                buffer.width,
+                buffer.height
+            )
+        self.frame.blit_into(buffer, 0, 0, 0)
+
+    def present_frame(self):
+        gl.glPushAttrib(gl.GL_ENABLE_BIT | gl.GL_CURRENT_BIT)
+        gl.glDisable(gl.GL_BLEND)
+        gl.glColor4f(1, 1, 1, 1)
+        self.frame.blit(
+            0, 0,
+            width=self.window.width,
+            height=self.window.height
+        )
+        gl.glPopAttrib()
+
+    def on_expose(self):
+        self.invalidate()
+
+    def on_resize(self, width, height):
+        self.frame = None
+        self.invalidate()
 
     def on_key_press(self, *args):
         return EVENT_HANDLED
@@ -193,7 +251,7 @@ N   new game         T    Tutorial"""
         self.clock.schedule(self.update_label)
 
     def update_label(self, dt):
-        opacity = 0.5 - math.cos(self.t * 4) * 0.5
+        opacity = 0.5 - math.cos(self.clock.t * 4) * 0.5
         self.label.color = (
             *self.label.color[:3],
             round(opacity * 255)
@@ -239,9 +297,11 @@ class IntroScreen(Screen):
         )
         savefile_save(self.map.name)
 
-    def on_draw(self):
-        gl.glClearColor(*self.BGCOLOR, 0)
-        self.window.clear()
+    def end(self):
+        super().end()
+        self.box_bg.delete()
+
+    def draw(self):
         self.box_bg.draw(
             80,
             80,
@@ -249,7 +309,6 @@ class IntroScreen(Screen):
             self.window.height - 160
         )
         self.batch.draw()
-        return EVENT_HANDLED
 
     def start(self):
         self.title = pyglet.sprite.Sprite(
@@ -0,0 +1,70 @@
+"""Encode offscreen frames to video by piping them to ffmpeg.
+
+Frames are streamed to ffmpeg as raw RGB, so nothing is written to disk
+but the finished video.  Writing to the pipe happens on a worker thread,
+so rendering the next frame can overlap with ffmpeg consuming the last.
+"""
+
+import queue
+import shutil
+import subprocess
+import threading
+
+
+class VideoEncoder:
+    # How many frames can be waiting for ffmpeg before rendering blocks.
+    MAX_PENDING = 8
+
+    def __init__(self, path, width, height, fps, ffmpeg='ffmpeg'):
+        exe = shutil.which(ffmpeg)
+        if not exe:
+            raise RuntimeError(f"Can't export video: {ffmpeg} not found")
+        self.path = path
+        self.proc = subprocess.Popen(
+            [
+                exe,
+                '-y',
+                '-loglevel', 'error',
+                '-f', 'rawvideo',
+                '-pix_fmt', 'rgb24',
+                '-s', f'{width}x{height}',
+                '-r', str(fps),
+                '-i', '-',
+                # glReadPixels gives us the bottom row first
+                '-vf', 'vflip',
+                '-pix_fmt', 'yuv420p',
+                str(path),
+            ],
+            stdin=subprocess.PIPE,
+        )
+        self.frames = queue.Queue(self.MAX_PENDING)
+        self.error = None
+        self.writer = threading.Thread(target=self._write, daemon=True)
+        self.writer.start()
+
+    def _write(self):
+        while True:
+            data = self.frames.get()
+            if data is None:
+                break
+            if self.error:
+                continue
+            try:
+                self.proc.stdin.write(data)
+            except OSError as e:
+                self.error = e
+
+    def add_frame(self, n, data):
+        """Queue a frame, as returned by Framebuffer.read()."""
+        if self.error:
+            raise RuntimeError(f"ffmpeg stopped accepting frames: {self.error}")
+        self.frames.put(memoryview(data))
+
+    def close(self):
+        """Wait for all frames to be encoded."""
+        self.frames.put(None)
+        self.writer.join()
+        self.proc.stdin.close()
+        returncode = self.proc.wait()
+        if returncode:
+            raise RuntimeError(f"ffmpeg failed with exit status {returncode}")
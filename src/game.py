@@ -1,8 +1,8 @@
 #!/usr/bin/env python3
+import argparse
 import collections
-import datetime
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum, IntEnum
-import itertools
 from pathlib import Path
 import random
 import sys
@@ -10,7 +10,10 @@ import time
 import math
 import copy
 
-from pyglet import clock, gl
+from dynamite import startup
+startup.mark('interpreter start')
+
+from pyglet import gl
 from pyglet.text import Label
 import pyglet.image
 import pyglet.resource
@@ -23,8 +26,11 @@ old_print = print
 def print(*a): pass
 builtins.print = print
 import pygame.mixer
-pygame.mixer.pre_init(frequency=44100, size=-16, channels=2)
+startup.mark('pyglet/pygame import')
+import dynamite.sounds
+dynamite.sounds.pre_init()
 pygame.mixer.init()
+startup.mark('pygame.mixer.init')
 print = old_print
 builtins.print = old_print
 
@@ -33,15 +39,28 @@ from dynamite import coords
 from dynamite.particles import FlowParticles
 from dynamite.level_renderer import LevelRenderer
 import dynamite.scene
+import dynamite.titles
+from dynamite import assets
+from dynamite import assetpack
+from dynamite import clocks
+from dynamite import metrics
 from dynamite.maploader import load_map
 from dynamite.vec2d import Vec2D
-from dynamite.animation import animate as tween
+import dynamite.animation
+from dynamite.camera import Camera
+from dynamite.screenshot import Screenshots
+from dynamite.offscreen import run_offscreen
+from dynamite.video import VideoEncoder
+from dynamite.overlay import PerfOverlay
 from dynamite.titles import TitleScreen, Screen, IntroScreen, BackStoryScreen, GameWonScreen
 from dynamite.titles import BODY_FONT, savefile_remove
+startup.mark('game modules import')
 
 TITLE = "Dynamite Valley"
 
 
+tween = clocks.game.animate
+
 if '--no-tween' in sys.argv:
     def tween(obj, tween=None, duration=None, on_finished=None, **targets):
         for k, v in targets.items():
@@ -77,24 +96,52 @@ freeze_timer_logics = 5 * logics_per_second
 
 
 srcdir = Path(__file__).parent
-pyglet.resource.path = [
-    'images',
-    'levels',
-    'sounds',
-]
-pyglet.resource.reindex()
+pack_path = srcdir / 'assets.pack'
+if pack_path.exists():
+    # Built with "python -m dynamite.assetpack"; delete it to go back
+    # to loading the loose files.
+    assetpack.install(assetpack.AssetPack(pack_path))
+else:
+    # Absolute, because pyglet would look relative to __main__, which
+    # isn't us when run_game.py runs us in-process.
+    pyglet.resource.path = [
+        str(srcdir / 'images'),
+        str(srcdir / 'levels'),
+        str(srcdir / 'sounds'),
+    ]
+    pyglet.resource.reindex()
+startup.mark('pyglet.resource.reindex')
 pyglet.resource.add_font('edo.ttf')
+startup.mark('font registration')
 
 
-def load_sound(name):
-    return pygame.mixer.Sound(str(srcdir / 'sounds' / f'{name}.wav'))
+def declare_sound(name, **kwargs):
+    """Declare a sound effect, to be loaded along with the gameplay."""
+    return dynamite.sounds.declare(name, f'{name}.wav', group='gameplay', **kwargs)
 
 
-pygame.mixer.music.load(str(srcdir / 'sounds' / 'ambient.mp3'))
+# Sound effects are played every frame, even while the game is paused,
+# so nothing that was asked for is held back or lost.
+sound_manager = dynamite.sounds.SoundManager()
+clocks.game.schedule(sound_manager.update)
 
 
-LevelRenderer.load()
-FlowParticles.load()
+frame_seconds = metrics.histogram('frame_seconds', "Time to draw a frame of the game")
+logic_seconds = metrics.histogram(
+    'logic_tick_seconds',
+    "Time to run the logic ticks due in one callback, per tick",
+)
+ticks_collapsed = metrics.counter(
+    'logic_ticks_collapsed_total',
+    "Logic ticks run to catch up, beyond one per callback",
+)
+entities_spawned = metrics.counter('entities_spawned_total', "Entities created")
+detonations = metrics.counter('detonations_total', "Bombs detonated")
+level_load_seconds = metrics.histogram('level_load_seconds', "Time to start a level")
+
+
+assets.declare_images('tilemap', ['tilemap.png'], LevelRenderer.load, group='gameplay')
+assets.declare_images('ripple', ['ripple.png'], FlowParticles.load, group='gameplay')
 
 
 remapped_keys = {
@@ -411,7 +458,8 @@ class Game:
 
         if not self.paused:
             # log(f"logics {self.logics} advance by dt {dt}")
-            self.logics.advance(dt)
+            return self.logics.advance(dt)
+        return 0
 
     def transition_to(self, new_state):
         self.state = new_state
@@ -460,7 +508,7 @@ class Game:
 
 level_serial_number = 0
 
-class Level:
+class Level(pyglet.event.EventDispatcher):
     DEFAULT = MapOOB
     loading = True
     suppress_esc = False
@@ -517,9 +565,11 @@ class Level:
 
     def on_dam_spawned(self, dam):
         self.dams_remaining += 1
+        self.dispatch_event('on_dams_changed', self.dams_remaining)
 
     def on_dam_destroyed(self, dam):
         self.dams_remaining -= 1
+        self.dispatch_event('on_dams_changed', self.dams_remaining)
         if not self.dams_remaining:
             self.complete()
 
@@ -546,6 +596,7 @@ class Level:
             return self.game_won()
 
         log(f"{self} level finished")
+        preload_level(self.next)
         game.pause()
         game_screen.hide_hud()
         game_screen.display_big_text_and_wait("LEVEL COMPLETE!")
@@ -585,6 +636,8 @@ class Level:
             return
         game.unpause()
 
+Level.register_event_type('on_dams_changed')
+
 
 
 
@@ -763,6 +816,7 @@ class Entity:
         self.position = position
         if not isinstance(self, Claim):
             self.claim = Claim(self)
+            entities_spawned.inc()
 
     def on_level_loaded(self):
         pass
@@ -1396,8 +1450,8 @@ class Player(Entity):
         log(f"{self} can {verb} space!  it's navigable, and current occupant is {occupant}.")
         return True
 
-    thud = load_sound('thud')
-    splash = load_sound('splash')
+    thud = declare_sound('thud', voices=2)
+    splash = declare_sound('splash', voices=2)
 
     def on_key(self, k):
         log(f"{self} on key {key_repr(k)}")
@@ -1452,7 +1506,7 @@ class Player(Entity):
             else:
                 snd = self.thud
 
-            clock.schedule_once(lambda dt: snd.play(), 0.3)
+            sound_manager.play(snd, delay=0.3)
             if isinstance(bomb, RemoteControlBomb):
                 level.player.remote_control_bombs.append(bomb)
             if result is not True:
@@ -1997,10 +2051,11 @@ class Bomb(FloatingPlatform):
             standing_on.occupant = None
             standing_on = None
 
-    explosion = load_sound('explosion2')
+    explosion = declare_sound('explosion2', voices=4, priority=1)
 
     def detonation_effects(self):
-        self.explosion.play()
+        detonations.inc()
+        sound_manager.play(self.explosion)
         game_screen.screen_shake()
 
 
@@ -2034,7 +2089,7 @@ class TimedBomb(Bomb):
         self.spark.scale = 0.5
         self.spark.color = self.SPARK_COLOR
         self.t = 0
-        clock.schedule(self.update_spark)
+        clocks.game.schedule(self.update_spark)
         self.lit = True
 
     def on_blasted(self, bomb, position):
@@ -2051,7 +2106,7 @@ class TimedBomb(Bomb):
 
     def detonate(self):
         self.spark = None
-        clock.unschedule(self.update_spark)
+        clocks.game.unschedule(self.update_spark)
         super().detonate()
 
     def update_spark(self, dt):
@@ -2108,7 +2163,7 @@ class FreezeBomb(TimedBomb):
         self.detonated = True
 
         self.spark = None
-        clock.unschedule(self.update_spark)
+        clocks.game.unschedule(self.update_spark)
 
         if self._fling:
             assert self.position is None
@@ -2246,18 +2301,26 @@ class Bush(Scenery):
         )
 
 
-# We have to start with the window invisible in order to be able to set
-# the icon, under some WMs
-window = pyglet.window.Window(
-    coords.WIDTH,
-    coords.HEIGHT,
-    caption=TITLE,
-    visible=False,
-)
-window.set_icon(
-    *(pyglet.resource.image(f'icons/dv-{sz}.png') for sz in (128, 64, 32))
-)
-window.set_visible(True)
+window = None
+screenshots = None
+
+def create_window(visible=True):
+    global window
+    global screenshots
+    # We have to start with the window invisible in order to be able to set
+    # the icon, under some WMs
+    window = pyglet.window.Window(
+        coords.WIDTH,
+        coords.HEIGHT,
+        caption=TITLE,
+        visible=False,
+    )
+    window.set_icon(
+        *(pyglet.resource.image(f'icons/dv-{sz}.png') for sz in (128, 64, 32))
+    )
+    window.set_visible(visible)
+
+    screenshots = Screenshots(clocks.root)
 
 
 game = None
@@ -2283,15 +2346,50 @@ def next_level():
     assert level.next
     start_level(level.next)
 
+
+PreparedLevel = collections.namedtuple('PreparedLevel', 'map terrain flow')
+
+def prepare_level(filename):
+    """
+    Do the parts of loading a level that don't depend on
+    the game being set up: parse the map, and work out
+    the terrain and the water flow.  Safe on a worker thread.
+    """
+    map = load_map(filename, globals())
+    def get(pos):
+        return map.tiles.get(pos) or Level.DEFAULT
+    return PreparedLevel(
+        map,
+        LevelRenderer.layout(map.width, map.height, get),
+        FlowParticles.tables(map.width, map.height, get),
+    )
+
+# filename -> Future of a PreparedLevel
+_preloading = {}
+
+def preload_level(filename):
+    """Start preparing a level in the background, if we haven't already."""
+    if not filename or filename == 'finished' or filename in _preloading:
+        return
+    _preloading.clear()
+    _preloading[filename] = assets.executor.submit(prepare_level, filename)
+
 def start_level(filename):
     """Start the level with the given filename."""
+    start = time.perf_counter()
     global game_screen
     if game_screen:
         game_screen.end()
 
+    loaded = assets.require('gameplay')
+
     global game
     game = Game()
 
+    # log() needs the game, for its tick count
+    if loaded:
+        log("loaded assets:\n" + assets.report(loaded))
+
     global scene
     scene = dynamite.scene.Scene()
 
@@ -2301,7 +2399,12 @@ def start_level(filename):
 
     log(f"loading level {filename}")
 
-    map = load_map(filename, globals())
+    future = _preloading.pop(filename, None)
+    if future:
+        prepared = future.result()
+    else:
+        prepared = prepare_level(filename)
+    map = prepared.map
 
     level.set_map(map)
     level.name = filename
@@ -2317,8 +2420,8 @@ def start_level(filename):
         print(sarcastic_rejoinder)
         sys.exit(-1)
 
-    scene.level_renderer = LevelRenderer(level)
-    scene.flow = FlowParticles(level)
+    scene.level_renderer = LevelRenderer(level, prepared.terrain)
+    scene.flow = FlowParticles(level, prepared.flow)
 
     title = map.metadata.get('title')
     if title:
@@ -2329,6 +2432,10 @@ def start_level(filename):
     level.loading = False
     game.pause()
     IntroScreen(window, map, on_finished=start_game_screen)
+    level_load_seconds.observe(time.perf_counter() - start)
+
+    # Get the next level ready while the player reads the intro
+    preload_level(map.next)
 
 
 
@@ -2346,27 +2453,47 @@ def reload_level():
     start_level(level.name)
 
 
-def screenshot_path():
-    root = Path.cwd()
-    grabs = root / 'grabs'
-    grabs.mkdir(exist_ok=True)
-    day = (datetime.date.today() - datetime.date(2018, 10, 20)).days
-    for n in itertools.count(1):
-        path = grabs / f'day{day}-{n}.png'
-        if not path.exists():
-            return str(path)
-
-
 def timer_callback(dt):
+    overlay = game_screen.overlay if game_screen else None
     if game:
-        game.timer(dt)
+        start = time.perf_counter()
+        ticks = game.timer(dt) or 0
+        elapsed = time.perf_counter() - start
+        if ticks:
+            logic_seconds.observe(elapsed / ticks)
+            ticks_collapsed.inc(ticks - 1)
+        if overlay and overlay.visible:
+            overlay.add_logic(elapsed, ticks)
     if scene:
         scene.flow.update(dt)
 
 
-pyglet.clock.schedule_interval(timer_callback, callback_interval)
+clocks.game.schedule_interval(timer_callback, callback_interval)
+
+def perf_counts():
+    """Counts of things that cost us time, for the performance overlay."""
+    pool = scene.explosions.stats() if scene else {}
+    return [
+        ("timers", len(game.logics.timers) if game else 0),
+        ("actors", len(scene.objects) if scene else 0),
+        ("ripples", scene.flow.particles if scene and hasattr(scene, 'flow') else 0),
+        ("particles", len(scene.particles) if scene else 0),
+        ("explosions", pool.get('in_use', 0)),
+        ("expl. peak", pool.get('high_water', 0)),
+        ("expl. misses", pool.get('misses', 0)),
+        ("tweens", dynamite.animation.active_count()),
+        ("scheduled", clocks.scheduled_count()),
+    ]
+
 
 class GameScreen(Screen):
+    screenshot_requested = False
+    overlay = None
+    # stays up from one level to the next
+    overlay_shown = False
+
+    ASSETS = ['scene', 'gameplay']
+
     SPRITES = [
         dynamite.scene.AnchoredImg('canyon-wall', anchor_x=25, anchor_y=25),
         dynamite.scene.AnchoredImg('bubble-win', anchor_x=0, anchor_y=0),
@@ -2374,30 +2501,24 @@ class GameScreen(Screen):
     ]
 
     def start(self):
-        self.cam_offset = Vec2D(0, 0)
-        self.cam_vel = Vec2D(0, 0)
+        self.camera = Camera(self.window, self.clock)
+        self.overlay = PerfOverlay(self.window, self.clock, perf_counts)
+        if GameScreen.overlay_shown:
+            self.overlay.toggle()
         self.wall = pyglet.sprite.Sprite(
             self.sprites['canyon-wall'],
             x=0,
             y=self.window.height - 100,
         )
         self.create_hud()
-        self.clock.schedule(self.steady_cam)
-
-    def screen_shake(self):
-        angle = random.uniform(0, math.tau)
 
-        dist = 25
-        vx = dist * math.sin(angle)
-        vy = dist * math.cos(angle)
-        self.cam_offset = Vec2D(vx, vy)
+    def end(self):
+        if not self.ended:
+            self.overlay.delete()
+        super().end()
 
-    def steady_cam(self, dt):
-        dt = 0.05  # guarantee stable behaviour
-        self.cam_offset += self.cam_vel * dt
-        self.cam_vel -= self.cam_offset * 300 * dt
-        self.cam_vel *= 0.1 ** dt
-        self.cam_offset *= 0.01 ** dt
+    def screen_shake(self):
+        self.camera.shake()
 
     def create_hud(self):
         board = pyglet.resource.image('board.png')
@@ -2420,6 +2541,8 @@ class GameScreen(Screen):
             batch=self.batch,
             group=pyglet.graphics.OrderedGroup(2)
         )
+        # Only lay out the label again when there's something new to say.
+        level.push_handlers(on_dams_changed=self.update_hud)
 
     def show_oops_bubble(self):
         self.bubble = pyglet.sprite.Sprite(
@@ -2490,7 +2613,11 @@ class GameScreen(Screen):
         plural = "" if (level.dams_remaining == 1) else "s"
         return f'{level.dams_remaining} dam{plural} remaining'
 
+    def update_hud(self, dams_remaining):
+        self.hud_label.text = self.hud_text()
+
     def hide_hud(self):
+        level.remove_handlers(on_dams_changed=self.update_hud)
         self.hud_label.delete()
         self.hud_label = None
         self.board.delete()
@@ -2538,10 +2665,13 @@ class GameScreen(Screen):
             return
 
         if k == key.F12:
-            gl.glPixelTransferf(gl.GL_ALPHA_BIAS, 1.0)  # don't transfer alpha channel
-            image = pyglet.image.ColorBufferImage(0, 0, window.width, window.height)
-            image.save(screenshot_path())
-            gl.glPixelTransferf(gl.GL_ALPHA_BIAS, 0.0)  # restore alpha channel transfer
+            # taken at the end of the next on_draw
+            self.screenshot_requested = True
+            return
+
+        if k == key.F3:
+            self.overlay.toggle()
+            GameScreen.overlay_shown = self.overlay.visible
             return
         return game.on_key_press(k, modifiers)
 
@@ -2549,13 +2679,10 @@ class GameScreen(Screen):
         return game.on_key_release(k, modifiers)
 
     def on_draw(self):
+        start = time.perf_counter()
         gl.glClearColor(66 / 255, 125 / 255, 193 / 255, 0)
-        gl.glMatrixMode(gl.GL_MODELVIEW)
-        gl.glPushMatrix()
-
-        x, y = self.cam_offset
-        gl.glTranslatef(round(x), round(y), 0)
         window.clear()
+        self.camera.begin()
 
         scene.flow.draw()
         self.wall.draw()
@@ -2563,15 +2690,24 @@ class GameScreen(Screen):
         scene.level_renderer.draw()
 
         if not (level and level.player):
+            self.camera.end()
             return
 
         scene.draw()
-        gl.glPopMatrix()
+        self.camera.end()
 
-        if self.hud_label:
-            self.hud_label.text = self.hud_text()
         self.batch.draw()
 
+        if self.screenshot_requested:
+            self.screenshot_requested = False
+            screenshots.capture(0, 0, window.width, window.height)
+
+        elapsed = time.perf_counter() - start
+        frame_seconds.observe(elapsed)
+        if self.overlay.visible:
+            self.overlay.add_frame(elapsed)
+            self.overlay.draw()
+
 
 _title_screen = None
 
@@ -2579,6 +2715,7 @@ def title_screen_finished():
     global _title_screen
     next_level = _title_screen.next_level
     _title_screen = None
+    preload_level(next_level)
     BackStoryScreen(window, on_finished=lambda: start_game(next_level))
 
 
@@ -2589,13 +2726,165 @@ def title_screen():
         on_finished=title_screen_finished
     )
 
+def start_offscreen(level_name, seed):
+    """Start a level straight into gameplay, for rendering offscreen.
+
+    With the same seed, the same level renders the same frames,
+    so they can be compared against known-good ones.
+    """
+    random.seed(seed)
+    FlowParticles.SEED = seed
+
+    start_game(level_name)
+    # skip the intro screen
+    dynamite.titles.current_screen.end()
+
+
+def render_frames(level_name, directory, frames, fps, seed):
+    """
+    Render frames of a level into a directory of PNGs, without
+    a visible window, and without waiting for real time.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    start_offscreen(level_name, seed)
+
+    with ThreadPoolExecutor() as executor:
+        def save(n, data):
+            path = directory / f'frame-{n:05}.png'
+            executor.submit(Screenshots.save, path, window.width, window.height, data)
+        run_offscreen(window, frames, fps, save)
+
+
+def export_video(level_name, path, frames, fps, seed):
+    """Render frames of a level offscreen, encoding them to a video."""
+    # Start the level before ffmpeg, so if that fails there's no
+    # encoder left waiting for frames
+    start_offscreen(level_name, seed)
+    start = time.perf_counter()
+    encoder = VideoEncoder(path, window.width, window.height, fps)
+    try:
+        run_offscreen(window, frames, fps, encoder.add_frame)
+    finally:
+        encoder.close()
+    elapsed = time.perf_counter() - start
+    duration = frames / fps
+    print(
+        f"Exported {duration:.1f}s of video to {path} in {elapsed:.1f}s "
+        f"({duration / elapsed:.2f}x real time)"
+    )
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='run_game.py', description=TITLE)
+    parser.add_argument('level', nargs='?',
+        help="level to start on, skipping the title screen")
+    parser.add_argument('--no-tween', action='store_true',
+        help="jump straight to the end of every tween")
+    parser.add_argument('--render-frames', metavar='DIR',
+        help="render frames of the level offscreen into DIR as PNGs, then exit")
+    parser.add_argument('--export-video', metavar='FILE',
+        help="render the level offscreen and encode it to FILE with ffmpeg, then exit")
+    parser.add_argument('--frames', type=int, default=300,
+        help="how many frames to render (default %(default)s)")
+    parser.add_argument('--fps', type=int, default=60,
+        help="frames per second of game time to render (default %(default)s)")
+    parser.add_argument('--seed', type=int, default=0,
+        help="random seed for rendering (default %(default)s)")
+    parser.add_argument('--measure-startup', action='store_true',
+        help="print how long it took to get the first frame on screen")
+    parser.add_argument('--startup-report', action='store_true',
+        help="print how long each phase of startup took")
+    parser.add_argument('--startup-report-file', metavar='FILE',
+        help="write how long each phase of startup took to FILE")
+    parser.add_argument('--metrics', metavar='FILE',
+        help="every few seconds, write play metrics to FILE "
+             "(as JSON if it ends in .json, otherwise Prometheus text)")
+    return parser.parse_args(argv)
+
+
+def startup_asset_times():
+    """How long the assets loaded so far took, for the startup report."""
+    def total(names):
+        return sum(
+            (a.decode_time or 0) + (a.load_time or 0)
+            for name, a in assets.assets.items()
+            if a.loaded and name in names
+        )
+    sounds = [name for name in assets.assets if name.startswith('sounds/')]
+    return [
+        ("sound loading", total(sounds)),
+        ("tilemap/ripple loading", total(['tilemap', 'ripple'])),
+    ]
+
+
+def on_first_frame(measure=False, report=None):
+    """Note when the first frame is on screen, and say how long it took.
+
+    If report is '-', the startup report is printed; otherwise it
+    is written to that file.
+    """
+    flip = window.flip
+
+    def first_flip():
+        flip()
+        del window.flip
+        startup.mark('first on_draw')
+        if measure:
+            print(f"Time to first frame: {startup.elapsed():.3f}s")
+        if report:
+            text = startup.report(startup_asset_times())
+            if report == '-':
+                print(text)
+            else:
+                Path(report).write_text(text + '\n')
+
+    window.flip = first_flip
+
+
 def main(argv=[]):
-    if len(argv):
-        start_game(argv[0])
+    args = parse_args(argv)
+
+    if args.render_frames:
+        create_window(visible=False)
+        render_frames(
+            args.level or 'level1',
+            args.render_frames,
+            args.frames,
+            args.fps,
+            args.seed,
+        )
+        return
+
+    if args.export_video:
+        create_window(visible=False)
+        export_video(
+            args.level or 'level1',
+            args.export_video,
+            args.frames,
+            args.fps,
+            args.seed,
+        )
+        return
+
+    create_window()
+    startup.mark('window creation and icon')
+    if args.metrics:
+        metrics.Exporter(args.metrics, clocks.root)
+    report = args.startup_report_file or ('-' if args.startup_report else None)
+    if args.measure_startup or report:
+        on_first_frame(args.measure_startup, report)
+    if args.level:
+        start_game(args.level)
+        startup.mark('level start')
     else:
         title_screen()
+        startup.mark('title screen construction')
+        # Get on with loading the game while the player reads the title
+        assets.preload(clocks.root, 'scene', 'gameplay')
 
-    pygame.mixer.music.play(loops=-1)
+    dynamite.sounds.play_music(srcdir / 'sounds' / 'ambient.mp3')
 
     try:
         pyglet.app.run()
@@ -2605,4 +2894,3 @@ def main(argv=[]):
 
 if __name__ == "__main__":
     main(sys.argv[1:])
-
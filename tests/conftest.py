@@ -0,0 +1,9 @@
+import sys
+from pathlib import Path
+
+import pyglet
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+# Let modules that use pyglet's graphics be imported without a display
+pyglet.options['shadow_window'] = False
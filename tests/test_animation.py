@@ -0,0 +1,17 @@
+import numpy as np
+import pytest
+
+from dynamite.animation import TWEEN_FUNCTIONS, TWEEN_INDEX, ease_many
+
+
+@pytest.mark.parametrize('name', sorted(TWEEN_FUNCTIONS))
+def test_tables_match_tween_functions(name):
+    """The lookup tables are within 0.001 of the analytic curves."""
+    rng = np.random.RandomState(0)
+    n = np.concatenate([[0.0, 1.0], rng.uniform(0, 1, 100000)])
+    curves = np.full(len(n), TWEEN_INDEX[name])
+
+    eased = ease_many(curves, n)
+    expected = np.array([TWEEN_FUNCTIONS[name](x) for x in n])
+
+    assert np.max(np.abs(eased - expected)) < 1e-3